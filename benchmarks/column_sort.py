@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+# column_sort.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Times sorting rows by the Name and Value columns with the cached sort
+# keys against converting both details on every comparison, like the
+# sorter used to do. The names must come out in the same order, the
+# values, which used to be compared ignoring the unit, by base unit and
+# magnitude.
+#
+# usage: benchmarks/column_sort.py [rows]
+
+import functools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import sorting
+from src import units
+
+class Row:
+    sort_keys = None
+
+    def __init__(self, details):
+        self.details = details
+
+    def get_detail(self, detail_call):
+        return self.details.get(detail_call)
+
+def split_string_with_unit(input_string):
+    if input_string == None:
+        return 0, "  "
+    index_of_space = str(input_string).find(" ")
+    if index_of_space != -1:
+        first_part = input_string[:index_of_space]
+        second_part = input_string[index_of_space + 1:]
+        try:
+            float(first_part)
+        except:
+            return 0, "  "
+        return first_part, second_part
+    try:
+        float(input_string)
+    except:
+        return 0, "  "
+    return input_string, "  "
+
+def old_compare(obj_1, obj_2, detail_call, detail_type):
+    obj_1_detail = obj_1.get_detail(detail_call)
+    obj_2_detail = obj_2.get_detail(detail_call)
+
+    if detail_type in ["int", "cost", "value"]:
+        if detail_type == "value":
+            obj_1_detail, unit = split_string_with_unit(obj_1_detail)
+            obj_2_detail, unit = split_string_with_unit(obj_2_detail)
+        if obj_1_detail == None:
+            obj_1_detail = 0
+        if obj_2_detail == None:
+            obj_2_detail = 0
+        if float(obj_1_detail) < float(obj_2_detail):
+            return -1
+        elif float(obj_1_detail) == float(obj_2_detail):
+            return 0
+        return 1
+
+    if str(obj_1_detail).lower() < str(obj_2_detail).lower():
+        return -1
+    elif str(obj_1_detail).lower() == str(obj_2_detail).lower():
+        return 0
+    return 1
+
+def make_rows(count):
+    names = ["Resistor", "capacitor", "Inductor", "diode", "Transistor", "LED"]
+    unit_names = ["kΩ", "Ω", "nF", "uF", "mH"]
+    rows = []
+    for index in range(count):
+        rows.append(Row({"item_name": random.choice(names) + " " + str(random.randrange(count)),
+                "item_value": "{} {}".format(random.randrange(1000) / 10, random.choice(unit_names))}))
+    return rows
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+
+    for column_name, detail_call, detail_type in (("Name", "item_name", "str"), ("Value", "item_value", "value")):
+        start = time.perf_counter()
+        old_order = sorted(rows, key=functools.cmp_to_key(
+                lambda obj_1, obj_2: old_compare(obj_1, obj_2, detail_call, detail_type)))
+        old_elapsed = time.perf_counter() - start
+
+        for row in rows:
+            row.sort_keys = None
+        start = time.perf_counter()
+        new_order = sorted(rows, key=functools.cmp_to_key(
+                lambda obj_1, obj_2: sorting.compare(obj_1, obj_2, detail_call, detail_type)))
+        new_elapsed = time.perf_counter() - start
+
+        if detail_type == "value":
+            keys = [units.normalize(row.get_detail(detail_call)) for row in new_order]
+            assert keys == sorted(keys, key=lambda key: (key[1], key[0]))
+        else:
+            assert [row.get_detail(detail_call) for row in old_order] == [row.get_detail(detail_call) for row in new_order]
+        print("{} rows by {}".format(count, column_name))
+        print("  converting details: {:8.3f} s".format(old_elapsed))
+        print("  cached sort keys:   {:8.3f} s  speedup {:5.2f}x".format(new_elapsed, old_elapsed / new_elapsed))
+
+if __name__ == "__main__":
+    main()
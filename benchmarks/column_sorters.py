@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# column_sorters.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Times sorting a model of items by the Name, Stock and Price columns with
+# a Gtk.CustomSorter calling back into python against the Gtk.StringSorter
+# and Gtk.NumericSorter the columns use now.
+#
+# usage: benchmarks/column_sorters.py [rows]
+
+import os
+import random
+import sys
+import time
+
+import gi
+
+gi.require_version('Gtk', '4.0')
+gi.require_version('Adw', '1')
+
+from gi.repository import Gtk, Gio, GObject
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.window import InventarioWindow, Item
+from src import sorting
+
+def make_items(count):
+    names = ["Resistor", "capacitor", "Inductor", "diode", "Transistor", "LED"]
+    model = Gio.ListStore(item_type=Item)
+    items = []
+    for index in range(count):
+        item = Item(len(InventarioWindow.details_names))
+        item.set_detail("item_id", "I{:06d}".format(index))
+        item.set_detail("item_name", random.choice(names) + " " + str(random.randrange(count)))
+        item.set_detail("item_stock_for_sale", random.randrange(500))
+        item.set_detail("item_cost", random.randrange(10000) / 100)
+        items.append(item)
+    model.splice(0, 0, items)
+    return model
+
+def time_sort(model, sorter):
+    start = time.perf_counter()
+    sort_model = Gtk.SortListModel(model=model, sorter=sorter)
+    sort_model.get_n_items()
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    model = make_items(count)
+
+    native_sorters = {
+        "item_name": Gtk.StringSorter.new(Gtk.PropertyExpression.new(Item, None, "item_name")),
+        "item_quantity": Gtk.NumericSorter.new(Gtk.PropertyExpression.new(Item, None, "item_quantity")),
+        "item_cost": Gtk.NumericSorter.new(Gtk.ClosureExpression.new(GObject.TYPE_DOUBLE,
+                lambda obj: sorting.sort_key(obj, "item_cost", "cost"), None)),
+    }
+    detail_types = {"item_name": "str", "item_quantity": "INT", "item_cost": "cost"}
+
+    for detail_call, native_sorter in native_sorters.items():
+        detail_type = detail_types[detail_call]
+        custom_sorter = Gtk.CustomSorter.new(lambda obj_1, obj_2, data: sorting.compare(
+                obj_1, obj_2, detail_call, detail_type), None)
+
+        for item in model:
+            item.sort_keys = None
+        custom_elapsed = time_sort(model, custom_sorter)
+
+        for item in model:
+            item.sort_keys = None
+        native_elapsed = time_sort(model, native_sorter)
+
+        print("{} items by {}".format(count, detail_call))
+        print("  custom sorter: {:8.3f} s".format(custom_elapsed))
+        print("  {:14s} {:8.3f} s  speedup {:5.2f}x".format(type(native_sorter).__name__ + ":",
+                native_elapsed, custom_elapsed / native_elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+# item_memory.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Compares the memory taken by the rows of an inventory with the details
+# kept as instance attributes, in list columns and in the typed columns
+# of item_records. Plain classes stand in for Item so it runs without
+# GTK, the fields and typecodes are the ones of item_records.
+#
+# usage: benchmarks/item_memory.py [rows]
+
+import itertools
+import os
+import random
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import records
+
+DETAILS = ["_item_id", "_item_category", "_item_name", "_item_package", "_item_cost",
+        "_item_value", "_item_manufacturer", "_item_description", "_item_creation",
+        "_item_modification", "_item_selling_price", "_item_stock_reserved",
+        "_item_stock_allocated", "_item_stock_planned", "_item_stock_on_order",
+        "_item_stock_for_sale", "_item_storage", "_unit_of_measure", "_item_part_number",
+        "_item_seller", "_item_low_stock", "_item_buy_link", "_item_datasheet",
+        "_item_custom_values_list"]
+STOCK_DETAILS = ["_item_stock_reserved", "_item_stock_allocated", "_item_stock_planned",
+        "_item_stock_on_order", "_item_stock_for_sale", "_item_low_stock"]
+TYPECODES = {"_item_cost": 'd', "_item_selling_price": 'd', "_key": 'q'}
+TYPECODES.update((detail, 'q') for detail in STOCK_DETAILS)
+
+def make_values(index):
+    rand = random.Random(index)
+    values = dict((detail, None) for detail in DETAILS)
+    values["_item_id"] = "ID" + str(index)
+    values["_item_name"] = "Resistor " + str(index)
+    values["_item_cost"] = rand.random() * 10
+    values["_item_selling_price"] = rand.random() * 20
+    for detail in STOCK_DETAILS:
+        values[detail] = rand.randrange(2000)
+    values["_item_custom_values_list"] = ()
+    return values
+
+def attribute_rows(count):
+    class Item:
+        sort_keys = None
+
+        def __init__(self, values, key):
+            for detail in DETAILS:
+                setattr(self, detail, values[detail])
+            self._key = key
+            self._dirty = False
+            self._dirty_callback = None
+
+    keys = itertools.count()
+    return [Item(make_values(index), next(keys)) for index in range(count)]
+
+def record_rows(count, typecodes):
+    defaults = dict((detail, None) for detail in DETAILS)
+    defaults.update({"_key": None, "_dirty": False, "_dirty_callback": None, "sort_keys": None})
+    store = records.RecordStore(defaults, typecodes)
+
+    class Item:
+        def __init__(self, values, key):
+            self._row = store.new_row()
+            self._key = key
+            for detail in DETAILS:
+                setattr(self, detail, values[detail])
+
+    records.install_fields(Item, store)
+    keys = itertools.count()
+    return [Item(make_values(index), next(keys)) for index in range(count)], store
+
+def measure(make):
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    kept = make()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    return used
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    print(f"{rows} rows, id and name strings included")
+    for name, make in [("instance attributes", lambda: attribute_rows(rows)),
+            ("list columns", lambda: record_rows(rows, {})),
+            ("typed columns", lambda: record_rows(rows, TYPECODES))]:
+        print(f"{name:20} {measure(make) / rows:6.0f} B/row")
+
+if __name__ == "__main__":
+    main()
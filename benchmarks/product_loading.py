@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# product_loading.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Measures how parsing the products/ folder scales with the number of
+# workers of the process pool, forced on whatever the number of files, and
+# estimates from the cost of parsing a file and of unpickling its result
+# from how many files each pool size beats parsing in process, to compare
+# with storage.PRODUCTS_POOL_THRESHOLD.
+#
+# usage: benchmarks/product_loading.py [products] [parts per product]
+
+import csv
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import storage
+
+product_detail_calls = ["product_id", "product_category", "product_name", "product_stock",
+        "product_package", "product_part_number", "product_revision", "product_cost",
+        "product_manufacturer", "product_seller", "product_storage", "product_description",
+        "product_selling_price", "product_stock_reserved", "product_stock_allocated",
+        "product_stock_planned", "product_stock_on_order", "product_stock_for_sale",
+        "product_creation", "product_modification"]
+
+part_detail_calls = ["part_id", "part_category", "used_quantity", "part_name",
+        "part_description", "part_package", "part_part_number", "part_cost",
+        "part_manufacturer", "part_seller", "part_storage", "part_stock_reserved",
+        "part_stock_allocated", "part_stock_planned", "part_stock_on_order",
+        "part_stock_for_sale", "part_datasheet", "part_last_position", "part_type"]
+
+product_detail_types = {"product_stock": "int", "product_cost": "cost",
+        "product_selling_price": "cost", "product_stock_reserved": "int",
+        "product_stock_allocated": "int", "product_stock_planned": "int",
+        "product_stock_on_order": "int", "product_stock_for_sale": "int"}
+
+def write_products(folder, products, parts):
+    for product_index in range(products):
+        product_id = "P{:05d}".format(product_index)
+        with open(os.path.join(folder, product_id + ".csv"), 'w', newline='\n') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(product_detail_calls)
+            writer.writerow([product_id, "ELECTRONICS", "Board " + product_id, 12, "PCB",
+                    "PN-" + product_id, "A", 12.5, "Nokse", "Shop", "Shelf 3",
+                    "A synthetic product", 19.99, 1, 2, 3, 4, 5, "2023.10.01", "2023.10.02"])
+            writer.writerow(part_detail_calls)
+            for part_index in range(parts):
+                writer.writerow(["I{:05d}".format(part_index), "ELECTRONICS", 2, "Resistor",
+                        "A synthetic part", "0805", "RC0805", 0.01, "Yageo", "Shop", "Box 1",
+                        0, 0, 0, 0, 100, "", part_index, "item"])
+
+def main():
+    products = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    parts = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as folder:
+        write_products(folder, products, parts)
+        product_files = storage.list_product_files(folder)
+
+        print("{} products with {} parts each, {} cpus".format(products, parts, os.cpu_count()))
+        workers_list = sorted(set([1, 2, 4, 8, os.cpu_count() or 1]))
+        serial_time = None
+        for workers in workers_list:
+            start = time.perf_counter()
+            results = storage.parse_product_files(product_files, product_detail_types, workers, threshold=0)
+            elapsed = time.perf_counter() - start
+            if serial_time == None:
+                serial_time = elapsed
+            print("{:>3} workers: {:8.3f} s  speedup {:5.2f}x".format(workers, elapsed, serial_time / elapsed))
+
+        # what a pool can't avoid: starting the workers and unpickling the results
+        start = time.perf_counter()
+        storage.parse_product_files(product_files[:1] * 2, product_detail_types, 2, threshold=0)
+        pool_start_time = time.perf_counter() - start
+        pickled = [pickle.dumps(result) for result in results]
+        start = time.perf_counter()
+        for data in pickled:
+            pickle.loads(data)
+        unpickle_time = (time.perf_counter() - start) / len(pickled)
+        parse_time = serial_time / len(product_files)
+
+        print("parse {:.3f} ms, unpickle {:.3f} ms per file, pool start {:.3f} s".format(
+                parse_time * 1000, unpickle_time * 1000, pool_start_time))
+        for workers in [2, 4, 8, 16]:
+            saved = parse_time - parse_time / workers - unpickle_time
+            break_even = "never" if saved <= 0 else "{:.0f} files".format(pool_start_time * workers / 2 / saved)
+            print("{:>3} workers break even from {}".format(workers, break_even))
+        print("PRODUCTS_POOL_THRESHOLD: {} files".format(storage.PRODUCTS_POOL_THRESHOLD))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+
+# search_filter.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Times filtering rows with the compiled search query against the per row
+# parsing the filter callback used to do, and a numeric range condition
+# answered by search.NumericIndex against a scan, and checks they agree.
+# The indexes are also built in steps like the window does, the longest
+# step being the longest the main loop waits on them. Last the search is
+# matched over a snapshot of record columns like the worker thread of the
+# window, timing the snapshot taken on the main thread apart.
+#
+# usage: benchmarks/search_filter.py [rows]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import records
+from src import search
+
+detail_calls = ["item_id", "item_category", "item_name", "item_description", "item_quantity",
+        "item_low_stock", "item_package", "item_part_number", "item_cost", "item_value",
+        "item_manufacturer", "item_seller", "item_storage", "item_selling_price",
+        "item_stock_reserved", "item_stock_allocated", "item_stock_planned",
+        "item_stock_on_order", "item_stock_for_sale", "item_buy_link", "item_datasheet",
+        "item_creation", "item_modification"]
+
+def old_filter(filter_parameters, get_detail):
+    show = True
+    for parameter in filter_parameters:
+        text = parameter[0]
+        detail_call = parameter[1]
+        item_detail = get_detail(detail_call)
+
+        if text == "":
+            continue
+
+        if text[0] == "!":
+            try:
+                float(text[2:])
+                float(item_detail)
+            except:
+                show = False
+                break
+            value = float(text[2:])
+            if text[1] == ">":
+                if float(item_detail) > value:
+                    continue
+            elif text[1] == "<":
+                if float(item_detail) < value:
+                    continue
+            else:
+                show = False
+                break
+
+        if item_detail == None:
+            show = False
+            break
+        if text.lower() in str(item_detail).lower():
+            continue
+        else:
+            show = False
+            break
+    return show
+
+def make_rows(count):
+    names = ["Resistor", "Capacitor", "Inductor", "Diode", "Transistor", "LED"]
+    rows = []
+    for index in range(count):
+        rows.append({"item_id": "I{:06d}".format(index), "item_category": "ELECTRONICS",
+                "item_name": names[index % len(names)] + " " + str(index),
+                "item_description": "A synthetic component", "item_quantity": index % 250,
+                "item_cost": "{:.2f}".format((index % 97) / 10), "item_manufacturer": "Yageo",
+                "item_storage": "Box " + str(index % 40)})
+    return rows
+
+def build_in_steps(build, rows):
+    # like the window, 32 rows at a time from an idle callback, returning
+    # the longest step
+    longest_step = 0
+    while build.position < len(rows):
+        start = time.perf_counter()
+        end = min(build.position + 32, len(rows))
+        build.step((key, rows[key].get) for key in range(build.position, end))
+        longest_step = max(longest_step, time.perf_counter() - start)
+    return longest_step
+
+def record_rows(rows):
+    # the rows kept in a RecordStore and read through properties, like
+    # the items
+    store = records.RecordStore(dict(("_" + detail_call, None) for detail_call in detail_calls + ["key"]),
+            {"_key": 'q'})
+
+    class Row:
+        def __init__(self, details, key):
+            self._row = store.new_row()
+            self._key = key
+            for detail_call, value in details.items():
+                setattr(self, "_" + detail_call, value)
+
+        def get_detail(self, name):
+            return getattr(self, name, None)
+
+    for detail_call in detail_calls:
+        setattr(Row, detail_call, property(lambda self, attribute="_" + detail_call: getattr(self, attribute)))
+    records.install_fields(Row, store)
+    return store, Row, [Row(details, key) for key, details in enumerate(rows)]
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = make_rows(count)
+
+    filter_parameters = [["", detail_call] for detail_call in detail_calls]
+    filter_parameters[detail_calls.index("item_name")][0] = "RES"
+    filter_parameters[detail_calls.index("item_quantity")][0] = "!>20"
+
+    start = time.perf_counter()
+    old_result = [row for row in rows if old_filter(filter_parameters, row.get)]
+    old_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query = search.compile_query(filter_parameters)
+    new_result = [row for row in rows if query.matches(row.get)]
+    new_elapsed = time.perf_counter() - start
+
+    assert old_result == new_result
+    print("{} rows, {} matching".format(count, len(new_result)))
+    print("per row parsing: {:8.3f} s".format(old_elapsed))
+    print("compiled query:  {:8.3f} s  speedup {:5.2f}x".format(new_elapsed, old_elapsed / new_elapsed))
+
+    start = time.perf_counter()
+    index = search.NumericIndex(search.NUMERIC_INDEXED_DETAILS)
+    index.add_all((key, row.get) for key, row in enumerate(rows))
+    index.sorted_pairs("item_quantity")
+    build_elapsed = time.perf_counter() - start
+
+    build = search.IndexBuild(search.NumericIndex(search.NUMERIC_INDEXED_DETAILS))
+    longest_step = build_in_steps(build, rows)
+    start = time.perf_counter()
+    build.index.sorted_pairs("item_quantity")
+    longest_step = max(longest_step, time.perf_counter() - start)
+
+    query = search.compile_query([["!>240", "item_quantity"]])
+    start = time.perf_counter()
+    scan_result = set(key for key, row in enumerate(rows) if query.matches(row.get))
+    scan_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_result = index.candidates(query)
+    index_elapsed = time.perf_counter() - start
+
+    assert scan_result == index_result
+    print("index build:     {:8.3f} s".format(build_elapsed))
+    print("longest step:    {:8.3f} s".format(longest_step))
+
+    build = search.IndexBuild(search.TrigramIndex(search.INDEXED_DETAILS))
+    start = time.perf_counter()
+    longest_step = build_in_steps(build, rows)
+    build_elapsed = time.perf_counter() - start
+    print("text index build:{:8.3f} s".format(build_elapsed))
+    print("longest step:    {:8.3f} s".format(longest_step))
+    print("range scan:      {:8.3f} s".format(scan_elapsed))
+    print("numeric index:   {:8.3f} s  speedup {:5.2f}x".format(index_elapsed, scan_elapsed / index_elapsed))
+
+    store, row_class, kept = record_rows(rows)
+    query = search.compile_query(filter_parameters)
+    start = time.perf_counter()
+    snapshot = store.snapshot()
+    snapshot_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    row = records.view_class(row_class, snapshot, ["get_detail"])()
+    keys = set()
+    for record in snapshot.live_rows():
+        row._row = record
+        if query.matches(row.get_detail):
+            keys.add(row._key)
+    match_elapsed = time.perf_counter() - start
+
+    assert keys == set(key for key, details in enumerate(rows) if query.matches(details.get))
+    print("column snapshot: {:8.3f} s".format(snapshot_elapsed))
+    print("record matching: {:8.3f} s  {:6.0f} rows per 16 ms frame".format(match_elapsed,
+            0.016 * count / match_elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+# set_detail.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Compares building items with the precomputed detail registry against
+# the inspect.getmembers lookup it replaced. The old lookup is too slow to
+# run on every row, it is timed on a sample and scaled up.
+#
+# usage: benchmarks/set_detail.py [rows] [sampled rows]
+
+import inspect
+import os
+import sys
+import time
+
+import gi
+
+gi.require_version('Gtk', '4.0')
+gi.require_version('Adw', '1')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src.window import InventarioWindow, Item
+
+def set_detail_with_getmembers(item, detail_name, value):
+    attributes = inspect.getmembers(item, lambda a: not inspect.isroutine(a))
+
+    if detail_name == "item_quantity":
+        return
+
+    for attr_name, _ in attributes:
+        if attr_name == f"_{detail_name}":
+            setattr(item, f"_{detail_name}", value)
+            return
+
+    raise ValueError(f"Invalid detail name: {detail_name}")
+
+def make_rows(count):
+    rows = []
+    for index in range(count):
+        row = []
+        for name, detail_call, detail_type in InventarioWindow.details_names:
+            if detail_type in ["int", "INT"]:
+                row.append((detail_call, index % 100))
+            elif detail_type == "cost":
+                row.append((detail_call, 0.25))
+            else:
+                row.append((detail_call, detail_call + str(index)))
+        rows.append(row)
+    return rows
+
+def build_items(rows, set_detail):
+    start = time.perf_counter()
+    for row in rows:
+        item = Item(len(row))
+        for detail_call, value in row:
+            set_detail(item, detail_call, value)
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sample = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    rows = make_rows(count)
+    fields = len(InventarioWindow.details_names)
+    print("{} rows with {} details each".format(count, fields))
+
+    elapsed = build_items(rows[:sample], set_detail_with_getmembers) * count / sample
+    print("inspect.getmembers: {:8.3f} s (scaled from {} rows)".format(elapsed, sample))
+
+    registry_elapsed = build_items(rows, Item.set_detail)
+    print("detail registry:    {:8.3f} s  speedup {:5.1f}x".format(registry_elapsed, elapsed / registry_elapsed))
+
+if __name__ == "__main__":
+    main()
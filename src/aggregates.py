@@ -0,0 +1,194 @@
+# aggregates.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import array
+import math
+
+# numpy is optional, without it the same columns are kept in arrays and
+# reduced in python
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+STOCK_DETAILS = ["item_stock_reserved", "item_stock_allocated", "item_stock_planned",
+        "item_stock_on_order", "item_stock_for_sale"]
+
+NUMERIC_COLUMNS = ["stock", "cost", "low_stock", "selling_price"]
+GROUP_COLUMNS = {"category": "item_category", "storage": "item_storage", "seller": "item_seller"}
+
+def to_number(value, default):
+    if value == None or value == "":
+        return default
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def item_entry(get_detail):
+    """The aggregated values of an item, get_detail(detail_call) returning
+    the stored value of a detail."""
+    stock = sum(to_number(get_detail(detail_call), 0) for detail_call in STOCK_DETAILS)
+    # the tiles always showed the cost rounded like the item_cost property
+    cost = round(to_number(get_detail("item_cost"), 0), 2)
+    # no threshold never counts as low stock, like in the low stock page
+    low_stock = to_number(get_detail("item_low_stock"), 0)
+    selling_price = round(to_number(get_detail("item_selling_price"), 0), 2)
+    groups = tuple(get_detail(detail_call) or "" for detail_call in GROUP_COLUMNS.values())
+    return (stock, cost, low_stock, selling_price) + groups
+
+class ItemAggregates:
+    """Numeric and group columns of the items, in model order.
+
+    Kept in sync by the owner of the model through splice and update,
+    the grouped aggregates then reduce whole columns at once. The item
+    count, inventory value and stock counters are running totals,
+    adjusted by every splice for the entries it adds and removes only.
+    The numpy columns have spare room at their end like a list, so a
+    splice writes its entries in place and only moves the entries after
+    them, the columns are only built from scratch by reset.
+    """
+
+    def __init__(self):
+        self.reset([])
+
+    def __len__(self):
+        return self._length
+
+    def reset(self, entries):
+        self._group_names = dict((group, []) for group in GROUP_COLUMNS)
+        self._group_codes = dict((group, {}) for group in GROUP_COLUMNS)
+        self._numeric = dict((column, self.new_column('d', [])) for column in NUMERIC_COLUMNS)
+        self._groups = dict((group, self.new_column('l', [])) for group in GROUP_COLUMNS)
+        self._length = 0
+        self.count = 0
+        self.value = 0.0
+        self.low_stock = 0
+        self.out_of_stock = 0
+        self.splice(0, 0, entries)
+
+    def column(self, name):
+        column = self._numeric.get(name)
+        if column is None:
+            column = self._groups[name]
+        if numpy != None:
+            return column[:self._length]
+        return column
+
+    def new_column(self, typecode, values):
+        if numpy != None:
+            return numpy.array(values, dtype=numpy.float64 if typecode == 'd' else numpy.int64)
+        return array.array(typecode, values)
+
+    def group_code(self, group, name):
+        codes = self._group_codes[group]
+        code = codes.get(name)
+        if code == None:
+            code = codes[name] = len(self._group_names[group])
+            self._group_names[group].append(name)
+        return code
+
+    def columns_of(self, entries):
+        columns = {}
+        for index, column in enumerate(NUMERIC_COLUMNS):
+            columns[column] = [entry[index] for entry in entries]
+        for index, group in enumerate(GROUP_COLUMNS, len(NUMERIC_COLUMNS)):
+            columns[group] = [self.group_code(group, entry[index]) for entry in entries]
+        return columns
+
+    def count_entry(self, stock, cost, low_stock, sign):
+        self.count += sign
+        self.value += sign * stock * cost
+        if stock < low_stock:
+            self.low_stock += sign
+        if stock == 0:
+            self.out_of_stock += sign
+
+    def splice(self, position, n_removals, entries):
+        numeric = self._numeric
+        for index in range(position, position + n_removals):
+            self.count_entry(float(numeric["stock"][index]), float(numeric["cost"][index]),
+                    float(numeric["low_stock"][index]), -1)
+        for entry in entries:
+            self.count_entry(entry[0], entry[1], entry[2], 1)
+        if self.count == 0:
+            # drop the rounding left over by the removed values
+            self.value = 0.0
+
+        new_columns = self.columns_of(entries)
+        end = position + n_removals
+        length = self._length - n_removals + len(entries)
+        for columns, typecode in ((self._numeric, 'd'), (self._groups, 'l')):
+            for name, column in columns.items():
+                values = new_columns[name]
+                if numpy == None:
+                    column[position:end] = array.array(typecode, values)
+                    continue
+
+                if len(values) != n_removals:
+                    if length > len(column):
+                        # doubled, so appending stays linear overall
+                        grown = numpy.zeros(max(length, 2 * len(column)), dtype=column.dtype)
+                        grown[:self._length] = column[:self._length]
+                        column = columns[name] = grown
+                    column[position + len(values):length] = column[end:self._length]
+                column[position:position + len(values)] = values
+        self._length = length
+
+    def update(self, position, entry):
+        self.splice(position, 1, [entry])
+
+    def inventory_value(self):
+        stock = self.column("stock")
+        cost = self.column("cost")
+        if numpy != None:
+            return float(numpy.dot(stock, cost))
+        return math.fsum(s * c for s, c in zip(stock, cost))
+
+    def low_stock_count(self):
+        stock = self.column("stock")
+        low_stock = self.column("low_stock")
+        if numpy != None:
+            return int(numpy.count_nonzero(stock < low_stock))
+        return sum(1 for s, l in zip(stock, low_stock) if s < l)
+
+    def out_of_stock_count(self):
+        stock = self.column("stock")
+        if numpy != None:
+            return int(numpy.count_nonzero(stock == 0))
+        return sum(1 for s in stock if s == 0)
+
+    def value_by(self, group):
+        """Return the inventory value of each name of group ("category",
+        "storage" or "seller"), highest first."""
+        stock = self.column("stock")
+        cost = self.column("cost")
+        codes = self.column(group)
+        names = self._group_names[group]
+
+        if numpy != None:
+            totals = numpy.bincount(codes, weights=stock * cost, minlength=len(names)).tolist()
+        else:
+            totals = [0.0] * len(names)
+            for code, s, c in zip(codes, stock, cost):
+                totals[code] += s * c
+
+        # names no longer used by any item keep a zero total
+        used = set(codes.tolist() if numpy != None else codes)
+        return sorted(((names[code], totals[code]) for code in used), key=lambda pair: -pair[1])
@@ -0,0 +1,226 @@
+# benchmark.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Run by "inventario --benchmark ROWS": a synthetic inventory is written to
+# a temporary folder and opened, then the items view is scrolled, sorted
+# and filtered one step per frame of its frame clock. The frame times of
+# every phase and the calls and time spent in the window callbacks are
+# printed, then the application quits without saving and cleanup removes
+# the inventory once the window is done writing. Without a display it
+# can run on a headless compositor or with GDK_BACKEND=broadway.
+
+from gi.repository import Gtk, GLib
+
+import functools
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from . import storage
+
+# the window callbacks timed, see instrument
+TIMED_METHODS = ["_on_factory_bind", "filter", "sort_func"]
+
+# the most frames a scroll phase takes
+SCROLL_FRAMES = 300
+
+class CallTimer:
+    """Calls and seconds spent in a function."""
+
+    def __init__(self):
+        self.calls = 0
+        self.elapsed = 0.0
+
+def instrument(cls, names=TIMED_METHODS):
+    """Wrap the methods names of cls so their calls are timed, returning a
+    CallTimer for each. Must run before the callbacks are connected."""
+    timers = {}
+    for name in names:
+        timer = timers[name] = CallTimer()
+        function = getattr(cls, name)
+
+        def timed(*args, function=function, timer=timer):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                timer.elapsed += time.perf_counter() - start
+                timer.calls += 1
+        setattr(cls, name, functools.wraps(function)(timed))
+    return timers
+
+def synthetic_item_rows(details_names, categories, units_of_measure, count, seed=0):
+    """Yield the rows of an inventory.csv of count items, header first."""
+    generator = random.Random(seed)
+    names = ["Resistor", "Capacitor", "Inductor", "Diode", "Transistor", "LED", "Screw", "Nut"]
+    yield [detail[1] for detail in details_names]
+
+    for index in range(count):
+        row = []
+        for name, detail_call, detail_type in details_names:
+            if detail_call == "item_id":
+                row.append("B{:07d}".format(index))
+            elif detail_type == "cat":
+                row.append(generator.choice(categories))
+            elif detail_type in ["int", "INT"]:
+                row.append(generator.randrange(100))
+            elif detail_type == "cost":
+                row.append(generator.randrange(10000) / 100)
+            elif detail_type == "value":
+                row.append("{} {}".format(generator.randrange(1000) / 10, generator.choice(units_of_measure).strip()))
+            elif detail_type in ["date", "DATE"]:
+                row.append("2023-{:02d}-{:02d}".format(generator.randrange(1, 13), generator.randrange(1, 29)))
+            else:
+                row.append("{} {} {}".format(generator.choice(names), name.lower(), generator.randrange(count)))
+        yield row
+
+def frame_statistics(frame_times):
+    if not frame_times:
+        return "no frames"
+    ordered = sorted(frame_times)
+    p95 = ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+    return "{:4d} frames, mean {:7.2f} ms, p95 {:7.2f} ms, max {:7.2f} ms".format(
+            len(ordered), sum(ordered) / len(ordered), p95, ordered[-1])
+
+class ViewBenchmark:
+    """Drives the items view of window through its phases, one step per
+    frame, and prints the report once done."""
+
+    def __init__(self, application, window, rows, timers):
+        self.application = application
+        self.window = window
+        self.rows = rows
+        self.timers = timers
+
+        self.inventory_path = None
+        self.last_inventory_path = window.settings.get_string("last-inventory-path")
+        self.phases = [("open", self.open_step),
+                ("scroll", self.scroll_step),
+                ("sort by name", functools.partial(self.sort_step, "Name")),
+                ("scroll sorted", self.scroll_step),
+                ("sort by value", functools.partial(self.sort_step, "Value")),
+                ("filter", self.filter_step),
+                ("scroll filtered", self.scroll_step),
+                ("clear filter", self.clear_filter_step)]
+        self.results = []
+
+    def start(self):
+        self.inventory_path = tempfile.mkdtemp(prefix="inventario-benchmark-")
+        snapshot = storage.InventorySnapshot(self.inventory_path)
+        snapshot.full = True
+        snapshot.item_columns = [detail[1] for detail in self.window.details_names]
+        snapshot.items_rows = list(synthetic_item_rows(self.window.details_names,
+                self.window.items_categories, self.window.units_of_measure, self.rows))
+        snapshot.preferences_rows = list(self.window.preferences_rows())
+        storage.write_snapshot(snapshot)
+
+        self.window.navigation_select_page(self.window.items_index)
+        self.start_phase(0)
+        self.window.read_inventory_file(self.inventory_path)
+        self.window.cv.add_tick_callback(self.on_tick)
+
+    def start_phase(self, index):
+        self.phase_index = index
+        self.phase_step = 0
+        self.frame_times = []
+        self.last_frame_time = None
+        self.phase_start = time.perf_counter()
+        self.phase_counters = dict((name, (timer.calls, timer.elapsed)) for name, timer in self.timers.items())
+
+    def end_phase(self):
+        name = self.phases[self.phase_index][0]
+        counters = dict((timer_name, (timer.calls - self.phase_counters[timer_name][0],
+                timer.elapsed - self.phase_counters[timer_name][1])) for timer_name, timer in self.timers.items())
+        self.results.append((name, time.perf_counter() - self.phase_start, list(self.frame_times), counters))
+
+    def on_tick(self, widget, frame_clock):
+        frame_time = frame_clock.get_frame_time()
+        if self.last_frame_time != None:
+            self.frame_times.append((frame_time - self.last_frame_time) / 1000)
+        self.last_frame_time = frame_time
+
+        done = self.phases[self.phase_index][1]()
+        self.phase_step += 1
+        if not done:
+            return GLib.SOURCE_CONTINUE
+
+        self.end_phase()
+        if self.phase_index + 1 < len(self.phases):
+            self.start_phase(self.phase_index + 1)
+            return GLib.SOURCE_CONTINUE
+
+        self.finish()
+        return GLib.SOURCE_REMOVE
+
+    def open_step(self):
+        return not self.window.is_loading()
+
+    def scroll_step(self):
+        adjustment = self.window.content_scrolled_window.get_vadjustment()
+        if self.phase_step == 0:
+            adjustment.set_value(adjustment.get_lower())
+            return False
+        bottom = adjustment.get_upper() - adjustment.get_page_size()
+        adjustment.set_value(min(bottom, adjustment.get_value() + adjustment.get_page_size()))
+        return adjustment.get_value() >= bottom or self.phase_step >= SCROLL_FRAMES
+
+    def sort_step(self, column_name):
+        # sorted in the first frame, the next one shows the result
+        if self.phase_step == 0:
+            for column in self.window.cv.get_columns():
+                if column.get_title() == column_name:
+                    self.window.cv.sort_by_column(column, Gtk.SortType.ASCENDING)
+            return False
+        return True
+
+    def filter_step(self):
+        if self.phase_step == 0:
+            self.window.search_entry.set_text("res")
+            self.window.filter_rows(None)
+            return False
+        return True
+
+    def clear_filter_step(self):
+        if self.phase_step == 0:
+            self.window.delete_filter_rows()
+            return False
+        return True
+
+    def finish(self):
+        print("Items view benchmark, {} items".format(self.rows))
+        for name, elapsed, frame_times, counters in self.results:
+            print("{:16s} {:8.3f} s  {}".format(name, elapsed, frame_statistics(frame_times)))
+            for timer_name, (calls, timer_elapsed) in counters.items():
+                if calls:
+                    print("    {:18s} {:9d} calls {:9.3f} s".format(timer_name, calls, timer_elapsed))
+        self.application.quit()
+
+    def cleanup(self):
+        """Called at shutdown, after the last write of the window."""
+        # the benchmark inventory must not be opened at the next start
+        self.window.settings.set_string("last-inventory-path", self.last_inventory_path)
+        if self.inventory_path == None:
+            return
+        cache_path = storage.inventory_cache_path(GLib.get_user_cache_dir() + "/inventario", self.inventory_path)
+        if os.path.isfile(cache_path):
+            os.remove(cache_path)
+        shutil.rmtree(self.inventory_path, ignore_errors=True)
@@ -0,0 +1,29 @@
+# details.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# The details are stored as text by every backend and converted back to
+# the python type of their detail type when read.
+
+def convert_detail_value(detail_type, value):
+    """Convert a stored value to the python type used for the given detail type."""
+    if detail_type == "int":
+        return int(round(float(value)))
+    elif detail_type == "cost":
+        return float(value)
+    return str(value)
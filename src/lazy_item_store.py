@@ -0,0 +1,144 @@
+# lazy_item_store.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+from gi.repository import GObject, Gio
+
+import array
+import collections
+import weakref
+
+class LazyItemStore(GObject.Object, Gio.ListModel):
+    """A list model of items backed by the rows of a storage.CsvRowIndex.
+
+    Rows are only turned into items when the model is asked for them, the
+    last cache_size of them are kept in an LRU and items still referenced
+    elsewhere keep their identity through a weak map. Items added to the
+    store or changed after being materialised are pinned, so their changes
+    are never evicted.
+    """
+    __gtype_name__ = "LazyItemStore"
+
+    def __init__(self, item_type, row_index, materialize, cache_size=2048):
+        super().__init__()
+
+        self._item_type = item_type
+        self._row_index = row_index
+        self._materialize = materialize
+        self._cache_size = cache_size
+
+        # positive entries are rows of row_index, negative ones keys of _pinned
+        self._entries = array.array('q', range(1, len(row_index)))
+        self._pinned = {}
+        self._next_pin = 1
+        self._cache = collections.OrderedDict()
+        self._alive = weakref.WeakValueDictionary()
+
+    def do_get_item_type(self):
+        return self._item_type.__gtype__
+
+    def do_get_n_items(self):
+        return len(self._entries)
+
+    def do_get_item(self, position):
+        if position >= len(self._entries):
+            return None
+
+        entry = self._entries[position]
+        if entry < 0:
+            return self._pinned[entry]
+
+        item = self._cache.get(entry)
+        if item != None:
+            self._cache.move_to_end(entry)
+            return item
+
+        item = self._alive.get(entry)
+        if item == None:
+            item = self._materialize(self._row_index.row(entry))
+            item.set_dirty_callback(lambda item, entry=entry: self.pin_entry(entry, item))
+            self._alive[entry] = item
+
+        self._cache[entry] = item
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return item
+
+    def pin_entry(self, entry, item):
+        try:
+            position = self._entries.index(entry)
+        except ValueError:
+            return
+        self._entries[position] = self.pin(item)
+        self._cache.pop(entry, None)
+        self._alive.pop(entry, None)
+
+    def pin(self, item):
+        key = -self._next_pin
+        self._next_pin += 1
+        self._pinned[key] = item
+        return key
+
+    def splice(self, position, n_removals, additions):
+        for entry in self._entries[position:position + n_removals]:
+            if entry < 0:
+                del self._pinned[entry]
+            else:
+                self._cache.pop(entry, None)
+                self._alive.pop(entry, None)
+        self._entries[position:position + n_removals] = array.array('q', [self.pin(item) for item in additions])
+        self.items_changed(position, n_removals, len(additions))
+
+    def append(self, item):
+        self.splice(len(self._entries), 0, [item])
+
+    def insert(self, position, item):
+        self.splice(position, 0, [item])
+
+    def remove(self, position):
+        self.splice(position, 1, [])
+
+    def remove_all(self):
+        self.splice(0, len(self._entries), [])
+
+    def find(self, item):
+        # like Gio.ListStore.find, only looking where item can be held
+        for key, pinned_item in self._pinned.items():
+            if pinned_item == item:
+                return True, self._entries.index(key)
+        for entry, alive_item in self._alive.items():
+            if alive_item == item:
+                return True, self._entries.index(entry)
+        return False, 0
+
+    def dirty_items(self):
+        return [item for item in self._pinned.values() if item.is_dirty()]
+
+    def iter_rows(self, columns, item_row):
+        """Yield a csv row for every entry, ordered as columns and followed
+        by the custom info. Rows that were never changed are copied from
+        the file without building their item."""
+        header = self._row_index.header
+        indexes = [header.index(column) if column in header else None for column in columns]
+
+        for entry in self._entries:
+            if entry < 0:
+                yield item_row(self._pinned[entry])
+                continue
+            row = self._row_index.row(entry)
+            yield [row[index] if index != None and index < len(row) else "" for index in indexes] + row[len(header):]
@@ -25,6 +25,7 @@ gi.require_version('Adw', '1')
 
 from gi.repository import Gtk, Gio, Adw, Gdk, GLib
 from .window import InventarioWindow
+from . import benchmark
 
 import threading
 import gettext
@@ -82,17 +83,29 @@ class InventarioApplication(Adw.Application):
         self.create_action('import', self.on_import_action, ['<primary>i'])
         self.create_action('open-inventory', self.on_open_inventory_action, ['<primary>o'])
 
+        self.benchmark_rows = 0
+        self.benchmark_timers = {}
+        self.benchmark = None
+        self.add_main_option("benchmark", 0, GLib.OptionFlags.NONE, GLib.OptionArg.INT,
+                "Scroll, sort and filter a synthetic inventory of ROWS items, print the frame times and quit", "ROWS")
+
+    def do_handle_local_options(self, options):
+        if options.contains("benchmark"):
+            self.benchmark_rows = options.lookup_value("benchmark").get_int32()
+        # go on with the default handling
+        return -1
+
     def on_new_inventory_action(self, widget, _):
-        path = self.win.settings.get_string("last-inventory-path")
-        self.win.save_inventory_file(path)
+        self.win.save_inventory_file(self.win.current_inventory_path)
+        self.win.cancel_loading()
         self.win.model.remove_all()
         self.win.products_model.remove_all()
+        self.win.mark_inventory_saved("")
         self.win.item_info_revealer.set_reveal_child(False)
         self.win.settings.set_string("last-inventory-path", "")
 
     def on_save_action(self, widget=None, _=None):
-        path = self.win.settings.get_string("last-inventory-path")
-        self.win.save_inventory_file(path)
+        self.win.save_inventory_file(self.win.current_inventory_path)
 
     def on_save_as_action(self, widget, _):
         self.win.save_inventory_file_as()
@@ -111,12 +124,20 @@ class InventarioApplication(Adw.Application):
         """
         self.win = self.props.active_window
         if not self.win:
+            if self.benchmark_rows > 0:
+                # before the window connects the callbacks to time
+                self.benchmark_timers = benchmark.instrument(InventarioWindow)
             start = time.time()
             self.win = InventarioWindow(application=self)
             end = time.time()
             print(end - start)
         self.win.present()
 
+        if self.benchmark_rows > 0:
+            self.benchmark = benchmark.ViewBenchmark(self, self.win, self.benchmark_rows, self.benchmark_timers)
+            self.benchmark.start()
+            return
+
         start = time.time()
         self.win.open_file_on_startup()
         end = time.time()
@@ -183,6 +204,18 @@ class InventarioApplication(Adw.Application):
         self.win.settings.bind("enable-coloured-categories", switch, 'active', Gio.SettingsBindFlags.DEFAULT)
         self.general_group.add(row)
 
+        row = Adw.ActionRow(title=gettext.gettext("Search while typing"), subtitle=gettext.gettext("Otherwise the search runs when pressing Enter"))
+        switch = Gtk.Switch(valign=Gtk.Align.CENTER)
+        row.add_suffix(switch)
+        self.win.settings.bind("live-search", switch, 'active', Gio.SettingsBindFlags.DEFAULT)
+        self.general_group.add(row)
+
+        row = Adw.ActionRow(title=gettext.gettext("Bind text cells in GTK"), subtitle=gettext.gettext("Faster scrolling in large tables, it will take effect at the next start"))
+        switch = Gtk.Switch(valign=Gtk.Align.CENTER)
+        row.add_suffix(switch)
+        self.win.settings.bind("builder-list-factories", switch, 'active', Gio.SettingsBindFlags.DEFAULT)
+        self.general_group.add(row)
+
         currency_symbols = ["€", "$", "£", "¥", "C$", "A$", "Fr", "¥", "₹", "₽", "₩", "R$", "$ or Mex$", "R", "NZ$"]
         row = Adw.ComboRow(title=("Currency"))
         drop_down = Gtk.DropDown.new_from_strings(currency_symbols) #valign=Gtk.Align.CENTER
@@ -209,8 +242,25 @@ class InventarioApplication(Adw.Application):
         self.win.settings.bind("autosave-delay", row, 'value', Gio.SettingsBindFlags.DEFAULT)
         group.add(row)
 
+        row = Adw.ActionRow(title=gettext.gettext("Load items lazily"), subtitle=gettext.gettext("Uses less memory with very large inventories, items are read from the file when shown"))
+        switch = Gtk.Switch(valign=Gtk.Align.CENTER)
+        row.add_suffix(switch)
+        self.win.settings.bind("lazy-loading", switch, 'active', Gio.SettingsBindFlags.DEFAULT)
+        group.add(row)
+
+        row = Adw.ComboRow(title=gettext.gettext("Save new inventories as"), subtitle=gettext.gettext("Opened inventories keep their format"))
+        row.set_model(Gtk.StringList.new([gettext.gettext("CSV folder"), gettext.gettext("SQLite database")]))
+        backend = self.win.settings.get_string("storage-backend")
+        if backend in self.win.storage_backends:
+            row.set_selected(self.win.storage_backends.index(backend))
+        row.connect("notify::selected", self.on_storage_backend_selected)
+        group.add(row)
+
         pref.present()
 
+    def on_storage_backend_selected(self, row, *args):
+        self.win.settings.set_string("storage-backend", self.win.storage_backends[row.get_selected()])
+
     def boolean_row(self, name, value, callback):
         row = Adw.ActionRow(title=name)
         rowSwitch = Gtk.Switch(valign = Gtk.Align.CENTER)
@@ -236,8 +286,13 @@ class InventarioApplication(Adw.Application):
     def do_shutdown(self):
         os.chdir(os.path.expanduser("~"))
         settings = Gio.Settings.new('io.github.nokse22.inventario')
-        settings.set_int("last-page", self.win.last_page)
-        self.on_save_action()
+        if self.benchmark == None:
+            settings.set_int("last-page", self.win.last_page)
+            self.on_save_action()
+        self.win.writer.flush()
+        if self.benchmark != None:
+            # the synthetic inventory is never saved, nor opened at the next start
+            self.benchmark.cleanup()
         Gtk.Application.do_shutdown(self)
 
 def main(version):
@@ -0,0 +1,180 @@
+# records.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import array
+import math
+
+# the value a typed column holds for a row whose value doesn't fit in it,
+# None or a value of another type, kept aside in the overflow of the column
+MISSING = {'q': -2 ** 63, 'd': math.nan}
+
+class RecordStore:
+    """Fields of many records kept as one column per field.
+
+    A record is a row index shared by all the columns, rows of released
+    records are reset to the defaults and reused. live tells which rows
+    are in use, so bulk operations can run over whole columns.
+
+    The fields given a typecode are kept in an array of that type, ints
+    in 'q' and floats in 'd' columns, without an object per value. A value
+    that doesn't fit, like None or a string, leaves MISSING in the array
+    and is kept in the overflow dict of the field by row instead.
+    """
+
+    def __init__(self, defaults, typecodes={}):
+        self.defaults = dict(defaults)
+        self.typecodes = dict(typecodes)
+        self.columns = {}
+        self.overflow = {}
+        for field in self.defaults:
+            typecode = self.typecodes.get(field)
+            if typecode == None:
+                self.columns[field] = []
+            else:
+                self.columns[field] = array.array(typecode)
+                self.overflow[field] = {}
+        self.live = bytearray()
+        self._free = []
+
+    def __len__(self):
+        return len(self.live)
+
+    def new_row(self):
+        if self._free:
+            row = self._free.pop()
+            self.live[row] = 1
+            return row
+
+        row = len(self.live)
+        for field, column in self.columns.items():
+            if field in self.overflow:
+                column.append(0)
+                self.set(field, row, self.defaults[field])
+            else:
+                column.append(self.defaults[field])
+        self.live.append(1)
+        return row
+
+    def free_row(self, row):
+        for field, column in self.columns.items():
+            if field in self.overflow:
+                self.set(field, row, self.defaults[field])
+            else:
+                column[row] = self.defaults[field]
+        self.live[row] = 0
+        self._free.append(row)
+
+    def snapshot(self):
+        """A copy of the columns, for reading the records from another
+        thread while this one keeps changing them."""
+        snapshot = RecordStore({})
+        snapshot.defaults = self.defaults
+        snapshot.typecodes = self.typecodes
+        snapshot.columns = dict((field, column[:]) for field, column in self.columns.items())
+        snapshot.overflow = dict((field, dict(values)) for field, values in self.overflow.items())
+        snapshot.live = self.live[:]
+        return snapshot
+
+    def live_rows(self):
+        return (row for row, live in enumerate(self.live) if live)
+
+    def get(self, field, row):
+        value = self.columns[field][row]
+        overflow = self.overflow.get(field)
+        # nan != nan, so this also finds the MISSING of 'd' columns
+        if overflow != None and (value != value or value == MISSING['q']):
+            return overflow.get(row)
+        return value
+
+    def set(self, field, row, value):
+        column = self.columns[field]
+        overflow = self.overflow.get(field)
+        if overflow == None:
+            column[row] = value
+        elif fits(column.typecode, value):
+            column[row] = value
+            if overflow:
+                overflow.pop(row, None)
+        else:
+            column[row] = MISSING[column.typecode]
+            if value == None:
+                overflow.pop(row, None)
+            else:
+                overflow[row] = value
+
+def fits(typecode, value):
+    # only the exact type, so a value always reads back as it was set
+    if typecode == 'q':
+        return type(value) is int and MISSING['q'] < value < 2 ** 63
+    return type(value) is float and value == value
+
+class Field:
+    """Descriptor reading and writing a column of a RecordStore at the row
+    held by the instance in _row."""
+
+    def __init__(self, store, name):
+        self.name = name
+        self.column = store.columns[name]
+
+    def __get__(self, obj, objtype=None):
+        if obj == None:
+            return self
+        return self.column[obj._row]
+
+    def __set__(self, obj, value):
+        self.column[obj._row] = value
+
+class TypedField(Field):
+    """Field of a typed column, going through the overflow of the store
+    for the values the column can't hold."""
+
+    def __init__(self, store, name):
+        super().__init__(store, name)
+        self.store = store
+
+    def __get__(self, obj, objtype=None):
+        if obj == None:
+            return self
+        return self.store.get(self.name, obj._row)
+
+    def __set__(self, obj, value):
+        self.store.set(self.name, obj._row, value)
+
+def install_fields(cls, store):
+    """Add a Field for every column of store to cls."""
+    for name in store.columns:
+        if name in store.overflow:
+            setattr(cls, name, TypedField(store, name))
+        else:
+            setattr(cls, name, Field(store, name))
+
+def view_class(cls, store, methods=()):
+    """A plain class reading the rows of store with the properties of cls
+    and the methods named in methods, store being a snapshot of the store
+    of cls. An instance is moved to a row by setting its _row, so another
+    thread can read the records without touching the objects of cls."""
+    attributes = {}
+    for name, value in vars(cls).items():
+        if not isinstance(value, Field) and getattr(value, "fget", None) != None:
+            attributes[name] = property(value.fget)
+    for name in methods:
+        attributes[name] = vars(cls)[name]
+    view = type(cls.__name__ + "View", (), attributes)
+    install_fields(view, store)
+    return view
@@ -0,0 +1,385 @@
+# search.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import bisect
+import math
+
+from . import units
+
+# The search bar conditions are [text, detail_call] pairs. A text starting
+# with "!>" or "!<" keeps the rows whose detail is a number greater or
+# less than the one following it, any other text keeps the rows whose
+# detail contains it, ignoring case. Numbers can have a unit, like
+# "!>4.7 kΩ", and are then compared in the base unit with the values
+# having the same one. A number without a unit only matches values
+# without one either, "!>5" doesn't match "4.7 kΩ".
+
+def greater_than(bound, unit):
+    def check(value):
+        number = units.magnitude(value, unit)
+        return number != None and number > bound
+    return check
+
+def less_than(bound, unit):
+    def check(value):
+        number = units.magnitude(value, unit)
+        return number != None and number < bound
+    return check
+
+def contains(needle):
+    def check(value):
+        return value != None and needle in str(value).lower()
+    return check
+
+class Condition:
+    """A single compiled search bar condition on one detail."""
+
+    def __init__(self, detail_call, kind, operand, check, unit=None):
+        self.detail_call = detail_call
+        # "greater", "less", "contains" or "never"
+        self.kind = kind
+        self.operand = operand
+        self.check = check
+        # the base unit of a numeric operand, "" for plain numbers
+        self.unit = unit
+
+    def implies(self, other):
+        """Whether every row matching this condition matches other too."""
+        if self.detail_call != other.detail_call:
+            return False
+        if self.kind == "never":
+            return True
+        if self.kind != other.kind or self.unit != other.unit:
+            return False
+        if self.kind == "contains":
+            return other.operand in self.operand
+        if self.kind == "greater":
+            return self.operand >= other.operand
+        return self.operand <= other.operand
+
+def compile_condition(text, detail_call):
+    if text[0] == "!":
+        normalized = units.normalize(text[2:])
+        if normalized == None:
+            return Condition(detail_call, "never", None, None)
+        bound, unit = normalized
+        if text[1] == ">":
+            return Condition(detail_call, "greater", bound, greater_than(bound, unit), unit)
+        if text[1] == "<":
+            return Condition(detail_call, "less", bound, less_than(bound, unit), unit)
+        return Condition(detail_call, "never", None, None)
+
+    needle = text.lower()
+    return Condition(detail_call, "contains", needle, contains(needle))
+
+class Query:
+    """The search bar conditions compiled once, to be matched against every
+    row. Empty conditions are dropped, needles are lowered and numeric
+    bounds parsed ahead of time."""
+
+    def __init__(self, conditions):
+        self.conditions = conditions
+        self.never = any(condition.kind == "never" for condition in conditions)
+        self._checks = [(condition.detail_call, condition.check) for condition in conditions]
+
+    def is_empty(self):
+        return not self.conditions
+
+    def implies(self, other):
+        """Whether every row matching this query matches other too."""
+        if self.never:
+            return True
+        return all(any(condition.implies(other_condition) for condition in self.conditions)
+                for other_condition in other.conditions)
+
+    def matches(self, get_detail):
+        """get_detail(detail_call) returns the value of a detail of the row."""
+        if self.never:
+            return False
+        for detail_call, check in self._checks:
+            if not check(get_detail(detail_call)):
+                return False
+        return True
+
+def compile_query(filter_parameters):
+    return Query([compile_condition(text, detail_call)
+            for text, detail_call in filter_parameters if text != ""])
+
+def query_change(previous, query):
+    """Return "same", "more_strict", "less_strict" or "different", telling
+    how the rows matching query relate to the ones matching previous."""
+    narrower = query.implies(previous)
+    broader = previous.implies(query)
+    if narrower and broader:
+        return "same"
+    if narrower:
+        return "more_strict"
+    if broader:
+        return "less_strict"
+    return "different"
+
+# details indexed by TrigramIndex, item_custom_info is the custom info
+INDEXED_DETAILS = ["item_name", "item_description", "item_part_number", "item_manufacturer",
+        "item_storage", "item_custom_info"]
+
+def trigrams(text):
+    return set(text[index:index + 3] for index in range(len(text) - 2))
+
+class TrigramIndex:
+    """Maps the trigrams of the lowered text of some details to the keys of
+    the rows containing them.
+
+    A row can only contain a needle if it has all of the needle trigrams,
+    so candidates() narrows a search down to a few rows, which still have
+    to be checked against the query. Needles shorter than three
+    characters can't be narrowed.
+    """
+
+    def __init__(self, details):
+        self.details = details
+        self._postings = {}
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, key, get_detail):
+        document = []
+        for detail_call in self.details:
+            value = get_detail(detail_call)
+            if value == None:
+                continue
+            detail_trigrams = tuple(trigrams(str(value).lower()))
+            document.append((detail_call, detail_trigrams))
+            for trigram in detail_trigrams:
+                postings = self._postings.get((detail_call, trigram))
+                if postings == None:
+                    postings = self._postings[(detail_call, trigram)] = set()
+                postings.add(key)
+        # tuples of strings only, which the garbage collector stops
+        # tracking, so a big index doesn't slow down every collection
+        self._documents[key] = tuple(document)
+
+    def add_all(self, rows):
+        for key, get_detail in rows:
+            self.add(key, get_detail)
+
+    def remove(self, key):
+        for detail_call, detail_trigrams in self._documents.pop(key, ()):
+            for trigram in detail_trigrams:
+                postings = self._postings[(detail_call, trigram)]
+                postings.discard(key)
+                if not postings:
+                    del self._postings[(detail_call, trigram)]
+
+    def update(self, key, get_detail):
+        self.remove(key)
+        self.add(key, get_detail)
+
+    @staticmethod
+    def usable_condition(condition):
+        return (condition.kind == "contains" and condition.detail_call in INDEXED_DETAILS
+                and len(condition.operand) >= 3)
+
+    @classmethod
+    def can_narrow(cls, query):
+        return any(cls.usable_condition(condition) for condition in query.conditions)
+
+    def candidates(self, query):
+        """Return the keys of the rows that can match query, or None when
+        none of its conditions can use the index."""
+        result = None
+        for condition in query.conditions:
+            if not self.usable_condition(condition) or condition.detail_call not in self.details:
+                continue
+
+            # intersecting from the rarest trigram keeps the sets small
+            postings = sorted((self._postings.get((condition.detail_call, trigram), set())
+                    for trigram in trigrams(condition.operand)), key=len)
+            keys = set(postings[0])
+            for other in postings[1:]:
+                if not keys:
+                    break
+                keys &= other
+            result = keys if result == None else result & keys
+        return result
+
+# details indexed by NumericIndex for the !> and !< conditions
+NUMERIC_INDEXED_DETAILS = ["item_quantity", "item_cost", "item_selling_price", "item_value",
+        "item_stock_reserved", "item_stock_allocated", "item_stock_planned",
+        "item_stock_on_order", "item_stock_for_sale"]
+
+def is_low_stock(get_detail):
+    # the rows shown in the low stock page
+    try:
+        return int(get_detail("item_quantity") or 0) < int(get_detail("item_low_stock") or 0)
+    except (TypeError, ValueError):
+        return False
+
+def is_out_of_stock(get_detail):
+    # the rows shown in the out of stock page
+    try:
+        return int(get_detail("item_quantity") or 0) == 0
+    except (TypeError, ValueError):
+        return False
+
+class NumericIndex:
+    """Keeps the keys of the rows sorted by the value of some numeric
+    details, so the !> and !< conditions are answered by bisecting
+    instead of converting every row. The keys of the rows in the low stock
+    and out of stock pages are kept in low_stock and out_of_stock.
+
+    Rows whose detail is not a number are left out of its sorted lists,
+    like they never match a numeric condition. There is a list per detail
+    and base unit, sorted by the magnitude in that unit, so a condition
+    only looks at the values with its own unit.
+    """
+
+    def __init__(self, details):
+        self.details = details
+        # (value, key) pairs by (detail_call, base unit), sorted
+        self._sorted = {}
+        self._values = {}
+        # the lists add_all appended to since they were last sorted
+        self._unsorted = set()
+        self.low_stock = set()
+        self.out_of_stock = set()
+
+    def __len__(self):
+        return len(self._values)
+
+    def sorted_pairs(self, detail_call, unit=""):
+        pairs = self._sorted.get((detail_call, unit), [])
+        if (detail_call, unit) in self._unsorted:
+            # the sorted run already there is merged with the new one
+            pairs.sort()
+            self._unsorted.discard((detail_call, unit))
+        return pairs
+
+    def add(self, key, get_detail):
+        for list_key, value in self.record(key, get_detail).items():
+            self._sorted.setdefault(list_key, [])
+            bisect.insort(self.sorted_pairs(*list_key), (value, key))
+
+    def add_all(self, rows):
+        """Add the (key, get_detail) of many rows. Their pairs are only
+        appended, the lists are sorted once by the next lookup instead of
+        on every call, so an index can be built a chunk at a time."""
+        rows = list(rows)
+        if len(rows) < 8:
+            for key, get_detail in rows:
+                self.add(key, get_detail)
+            return
+        for key, get_detail in rows:
+            for list_key, value in self.record(key, get_detail).items():
+                self._sorted.setdefault(list_key, []).append((value, key))
+                self._unsorted.add(list_key)
+
+    def record(self, key, get_detail):
+        # keeps the values and stock state of a row, returning the values
+        # by (detail_call, base unit)
+        values = {}
+        for detail_call in self.details:
+            measured = units.measure(get_detail(detail_call))
+            if measured != None:
+                values[(detail_call, measured[1])] = measured[0]
+        self._values[key] = values
+
+        if is_low_stock(get_detail):
+            self.low_stock.add(key)
+        if is_out_of_stock(get_detail):
+            self.out_of_stock.add(key)
+        return values
+
+    def remove(self, key):
+        for list_key, value in self._values.pop(key, {}).items():
+            pairs = self.sorted_pairs(*list_key)
+            del pairs[bisect.bisect_left(pairs, (value, key))]
+        self.low_stock.discard(key)
+        self.out_of_stock.discard(key)
+
+    def update(self, key, get_detail):
+        self.remove(key)
+        self.add(key, get_detail)
+
+    def greater(self, detail_call, bound, unit=""):
+        pairs = self.sorted_pairs(detail_call, unit)
+        return set(key for value, key in pairs[bisect.bisect_right(pairs, (bound, math.inf)):])
+
+    def less(self, detail_call, bound, unit=""):
+        pairs = self.sorted_pairs(detail_call, unit)
+        return set(key for value, key in pairs[:bisect.bisect_left(pairs, (bound, -math.inf))])
+
+    @staticmethod
+    def usable_condition(condition):
+        return condition.kind in ("greater", "less") and condition.detail_call in NUMERIC_INDEXED_DETAILS
+
+    @classmethod
+    def can_narrow(cls, query):
+        return any(cls.usable_condition(condition) for condition in query.conditions)
+
+    def candidates(self, query):
+        """Return the keys of the rows matching the numeric conditions of
+        query, or None when none of them can use the index."""
+        result = None
+        for condition in query.conditions:
+            if not self.usable_condition(condition) or condition.detail_call not in self.details:
+                continue
+            if condition.kind == "greater":
+                keys = self.greater(condition.detail_call, condition.operand, condition.unit)
+            else:
+                keys = self.less(condition.detail_call, condition.operand, condition.unit)
+            result = keys if result == None else result & keys
+        return result
+
+class IndexBuild:
+    """An index of the rows of a list model, built a few rows at a time.
+
+    The rows before position are in the index and splice keeps them up to
+    date with the changes of the model, the rows after it are only added
+    by step when the build gets to them. This way the rows added by a load
+    are not indexed one by one by the callbacks adding them. The index
+    covers the whole model once position reaches its length.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.position = 0
+
+    def step(self, rows):
+        """Index the (key, get_detail) of the rows following position."""
+        rows = list(rows)
+        self.index.add_all(rows)
+        self.position += len(rows)
+
+    def splice(self, position, removed_keys, rows):
+        """Follow a change of the model replacing the rows of removed_keys
+        at position with rows, (key, get_detail) pairs."""
+        if position == 0 and not rows and len(removed_keys) >= self.position:
+            # every indexed row is gone, like when the model is emptied
+            # before loading the inventory again
+            self.index = type(self.index)(self.index.details)
+            self.position = 0
+            return
+
+        for key in removed_keys[:max(0, self.position - position)]:
+            self.index.remove(key)
+        if position < self.position:
+            self.index.add_all(rows)
+            self.position = max(self.position - len(removed_keys), position) + len(rows)
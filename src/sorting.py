@@ -0,0 +1,82 @@
+# sorting.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# Columns are sorted by a key extracted once per row and column. Objects
+# with a sort_keys attribute keep their keys in it, a dict of detail_call
+# to key, and set it back to None when one of their details changes.
+
+from . import units
+
+NUMERIC_TYPES = ["int", "INT", "cost"]
+
+# the key of string details without a value, after any text
+LAST_STRING = chr(0x10FFFF)
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def extract_sort_key(value, detail_type):
+    """The key ordering the values of a column of detail_type."""
+    if detail_type == "value":
+        # grouped by base unit, then by magnitude in it
+        normalized = units.normalize(str(value)) if value != None else None
+        if normalized == None:
+            return ("", 0.0)
+        return (normalized[1], normalized[0])
+
+    if detail_type in NUMERIC_TYPES:
+        return to_float(value)
+
+    if value == None:
+        return LAST_STRING
+    return str(value).lower()
+
+def sort_key(obj, detail_call, detail_type):
+    keys = getattr(obj, "sort_keys", False)
+    if keys:
+        key = keys.get(detail_call)
+        if key != None:
+            return key
+    elif keys == False:
+        return extract_sort_key(obj.get_detail(detail_call), detail_type)
+    else:
+        keys = obj.sort_keys = {}
+
+    key = keys[detail_call] = extract_sort_key(obj.get_detail(detail_call), detail_type)
+    return key
+
+def compare(obj_1, obj_2, detail_call, detail_type):
+    # called for every comparison, the cached keys are looked up inline
+    try:
+        key_1 = obj_1.sort_keys[detail_call]
+    except (AttributeError, TypeError, KeyError):
+        key_1 = sort_key(obj_1, detail_call, detail_type)
+    try:
+        key_2 = obj_2.sort_keys[detail_call]
+    except (AttributeError, TypeError, KeyError):
+        key_2 = sort_key(obj_2, detail_call, detail_type)
+    return (key_1 > key_2) - (key_1 < key_2)
+
+def string_value(value):
+    if value == None:
+        return None
+    return str(value)
@@ -0,0 +1,259 @@
+# sqlite_storage.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import sqlite3
+
+from .details import convert_detail_value
+
+# an inventory folder containing this file is stored in sqlite
+DATABASE_NAME = "inventory.db"
+
+# the detail columns are added when first written, they follow details_names.
+# Items are keyed by their own rowid, item_id is only a detail: it can be
+# empty or shared by several items like in inventory.csv
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    item_id TEXT
+);
+CREATE INDEX IF NOT EXISTS items_item_id ON items (item_id);
+CREATE TABLE IF NOT EXISTS custom_values (
+    item INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    value TEXT,
+    PRIMARY KEY (item, position)
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS parts (
+    product_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (product_id, position)
+);
+CREATE TABLE IF NOT EXISTS preferences (
+    row INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    value TEXT,
+    PRIMARY KEY (row, position)
+);
+"""
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def connect(database_path):
+    connection = sqlite3.connect(database_path)
+    # WAL keeps a save from blocking readers and only appends to the log
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+def table_columns(connection, table):
+    return [row[1] for row in connection.execute("PRAGMA table_info(" + quote(table) + ")")]
+
+def ensure_columns(connection, table, columns):
+    existing = set(table_columns(connection, table))
+    for column in columns:
+        if column not in existing:
+            connection.execute("ALTER TABLE " + quote(table) + " ADD COLUMN " + quote(column))
+            existing.add(column)
+
+def upsert_statement(table, columns, key_columns):
+    names = ", ".join(quote(column) for column in columns)
+    values = ", ".join("?" for column in columns)
+    updates = ", ".join(quote(column) + " = excluded." + quote(column)
+            for column in columns if column not in key_columns)
+    statement = "INSERT INTO " + quote(table) + " (" + names + ") VALUES (" + values + ")"
+    statement += " ON CONFLICT (" + ", ".join(quote(column) for column in key_columns) + ")"
+    if updates:
+        return statement + " DO UPDATE SET " + updates
+    return statement + " DO NOTHING"
+
+def insert_statement(table, columns):
+    statement = "INSERT INTO " + quote(table) + " (" + ", ".join(quote(column) for column in columns)
+    return statement + ") VALUES (" + ", ".join("?" for column in columns) + ")"
+
+def write_custom_values(connection, item, custom_values):
+    connection.execute("DELETE FROM custom_values WHERE item = ?", (item,))
+    connection.executemany("INSERT INTO custom_values (item, position, name, value) VALUES (?, ?, ?, ?)",
+            [(item, index // 2, custom_values[index], custom_values[index + 1])
+            for index in range(0, len(custom_values) - 1, 2)])
+
+def find_item(connection, item_id):
+    """The rowid of the first item with item_id, or None."""
+    row = connection.execute("SELECT id FROM items WHERE item_id = ? ORDER BY id LIMIT 1", (item_id,)).fetchone()
+    return None if row == None else row[0]
+
+def insert_items(connection, columns, rows):
+    """Append inventory.csv style rows, the custom info following the details."""
+    ensure_columns(connection, "items", columns)
+    statement = insert_statement("items", columns)
+    for row in rows:
+        row = list(row)
+        item = connection.execute(statement, (row + [None] * len(columns))[:len(columns)]).lastrowid
+        write_custom_values(connection, item, row[len(columns):])
+
+def update_items(connection, columns, rows):
+    """Write inventory.csv style rows over the item with the same item_id,
+    appending the rows of new items."""
+    ensure_columns(connection, "items", columns)
+    id_index = columns.index("item_id")
+    insert = insert_statement("items", columns)
+    update = "UPDATE items SET " + ", ".join(quote(column) + " = ?" for column in columns) + " WHERE id = ?"
+    for row in rows:
+        row = list(row)
+        values = (row + [None] * len(columns))[:len(columns)]
+        item = find_item(connection, values[id_index])
+        if item == None:
+            item = connection.execute(insert, values).lastrowid
+        else:
+            connection.execute(update, values + [item])
+        write_custom_values(connection, item, row[len(columns):])
+
+def remove_items(connection, item_id):
+    """Remove every item with item_id, like storage.apply_item_changes."""
+    connection.execute("DELETE FROM custom_values WHERE item IN (SELECT id FROM items WHERE item_id = ?)", (item_id,))
+    connection.execute("DELETE FROM items WHERE item_id = ?", (item_id,))
+
+def upsert_product(connection, rows):
+    """Write the rows of a products/<id>.csv file: header, product, parts header, parts."""
+    product_columns = list(rows[0])
+    product_row = list(rows[1])
+    part_columns = list(rows[2]) if len(rows) > 2 else []
+
+    ensure_columns(connection, "products", product_columns)
+    connection.execute(upsert_statement("products", product_columns, ["product_id"]), product_row)
+
+    product_id = product_row[product_columns.index("product_id")]
+    connection.execute("DELETE FROM parts WHERE product_id = ?", (product_id,))
+    if part_columns:
+        ensure_columns(connection, "parts", part_columns)
+        columns = ["product_id", "position"] + part_columns
+        connection.executemany(insert_statement("parts", columns),
+                [[product_id, position] + list(row) for position, row in enumerate(rows[3:])])
+
+def write_snapshot(database_path, snapshot):
+    """Apply an InventorySnapshot to the database in a single transaction."""
+    connection = connect(database_path)
+    try:
+        with connection:
+            if snapshot.full:
+                for table in ["items", "custom_values", "products", "parts", "preferences"]:
+                    connection.execute("DELETE FROM " + table)
+            elif snapshot.items_rows != None:
+                connection.execute("DELETE FROM items")
+                connection.execute("DELETE FROM custom_values")
+
+            if snapshot.items_rows != None:
+                insert_items(connection, list(snapshot.items_rows[0]), snapshot.items_rows[1:])
+            for item_id in snapshot.removed_item_ids:
+                remove_items(connection, item_id)
+            if snapshot.changed_items:
+                update_items(connection, snapshot.item_columns, list(snapshot.changed_items.values()))
+
+            if snapshot.preferences_rows != None:
+                connection.execute("DELETE FROM preferences")
+                connection.executemany("INSERT INTO preferences (row, position, value) VALUES (?, ?, ?)",
+                        [(row_index, position, str(value))
+                        for row_index, row in enumerate(snapshot.preferences_rows)
+                        for position, value in enumerate(row)])
+
+            for rows in snapshot.products.values():
+                upsert_product(connection, rows)
+            for product_id in snapshot.removed_product_ids:
+                connection.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+                connection.execute("DELETE FROM parts WHERE product_id = ?", (product_id,))
+    finally:
+        connection.close()
+
+def convert_values(columns, row, detail_types):
+    details = []
+    for detail_call, value in zip(columns, row):
+        if value != None and value != "":
+            try:
+                details.append((detail_call, convert_detail_value(detail_types.get(detail_call), value)))
+            except (TypeError, ValueError):
+                pass
+    return tuple(details)
+
+def iter_item_batches(database_path, detail_types, batch_size):
+    """Read the items in batches of the same plain tuples as storage.iter_item_batches."""
+    connection = connect(database_path)
+    try:
+        columns = [column for column in table_columns(connection, "items") if column != "id"]
+        total = connection.execute("SELECT COUNT(*) FROM items").fetchone()[0] or 1
+        cursor = connection.execute("SELECT " + ", ".join(["id"] + [quote(column) for column in columns])
+                + " FROM items ORDER BY id")
+        read = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            # the primary key index of custom_values serves this lookup
+            items = [row[0] for row in rows]
+            custom_values = {}
+            for item, name, value in connection.execute(
+                    "SELECT item, name, value FROM custom_values WHERE item IN ("
+                    + ", ".join("?" for item in items) + ") ORDER BY item, position", items):
+                custom_values.setdefault(item, []).append((name, value))
+
+            batch = [(convert_values(columns, row[1:], detail_types), tuple(custom_values.get(row[0], ())))
+                    for row in rows]
+            read += len(rows)
+            yield batch, min(read / total, 1.0)
+        yield [], 1.0
+    finally:
+        connection.close()
+
+def load_products(database_path, detail_types):
+    """Read the products as the same plain tuples as storage.parse_product_file."""
+    connection = connect(database_path)
+    try:
+        product_columns = table_columns(connection, "products")
+        part_columns = table_columns(connection, "parts")[2:]
+
+        parts = {}
+        for row in connection.execute("SELECT " + ", ".join(["product_id"] + [quote(column) for column in part_columns])
+                + " FROM parts ORDER BY product_id, position"):
+            parts.setdefault(row[0], []).append(tuple(
+                    (column, "" if value == None else str(value)) for column, value in zip(part_columns, row[1:])))
+
+        id_index = product_columns.index("product_id")
+        return [(convert_values(product_columns, row, detail_types), parts.get(row[id_index], []))
+                for row in connection.execute("SELECT " + ", ".join(quote(column) for column in product_columns)
+                + " FROM products ORDER BY rowid")]
+    finally:
+        connection.close()
+
+def load_preferences_rows(database_path):
+    connection = connect(database_path)
+    try:
+        rows = []
+        for row_index, position, value in connection.execute(
+                "SELECT row, position, value FROM preferences ORDER BY row, position"):
+            while len(rows) <= row_index:
+                rows.append([])
+            rows[row_index].append(value)
+        return rows
+    finally:
+        connection.close()
@@ -0,0 +1,704 @@
+# storage.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import array
+import concurrent.futures
+import csv
+import hashlib
+import io
+import itertools
+import json
+import mmap
+import multiprocessing
+import os
+import pickle
+import stat
+import tempfile
+import threading
+
+from . import sqlite_storage
+from .details import convert_detail_value
+
+# Below this many product files a process pool costs more than it saves.
+# Every spawned worker starts a new interpreter, above 0.1 s each, and the
+# parsed tuples have to be unpickled back here, which takes a quarter to
+# half as long as parsing them. benchmarks/product_loading.py estimates a
+# pool of 4 to 8 workers breaks even from 5000 to 8000 files of 20 parts
+PRODUCTS_POOL_THRESHOLD = 10000
+
+# saves of a csv inventory append their changes to this file, it is
+# folded back into the csv files once it grows past JOURNAL_COMPACT_SIZE
+JOURNAL_NAME = "journal.jsonl"
+JOURNAL_COMPACT_SIZE = 1024 * 1024
+
+# bump when the layout of the parsed tuples changes
+CACHE_VERSION = 1
+
+def iter_csv_rows(file_path):
+    """Yield the rows of a csv file one by one, straight off the file handle."""
+    with open(file_path, 'r', newline='') as file:
+        yield from csv.reader(file)
+
+def parse_item_row(detail_call_list, row, detail_types):
+    """Parse an inventory.csv row into plain tuples.
+
+    Returns a tuple of (detail_call, value) pairs and a tuple of
+    (name, value) custom info pairs, values already converted.
+    """
+    details = []
+    for detail_call, value in zip(detail_call_list, row):
+        if value:
+            try:
+                details.append((detail_call, convert_detail_value(detail_types.get(detail_call), value)))
+            except ValueError:
+                pass
+
+    # after the known details the row contains name, value pairs of custom info
+    custom_values = row[len(detail_call_list):]
+    custom_values = tuple((custom_values[index], custom_values[index + 1])
+            for index in range(0, len(custom_values) - 1, 2))
+    return tuple(details), custom_values
+
+def iter_item_batches(file_path, detail_types, batch_size):
+    """Parse inventory.csv in batches of plain tuples.
+
+    Yields (batch, fraction) where fraction is how much of the file has
+    been read so far, to be shown as progress.
+    """
+    size = os.path.getsize(file_path) or 1
+    read = 0
+
+    with open(file_path, 'r', newline='') as file:
+        def lines():
+            nonlocal read
+            for line in file:
+                read += len(line)
+                yield line
+
+        reader = csv.reader(lines())
+        detail_call_list = next(reader, [])
+        batch = []
+        for row in reader:
+            batch.append(parse_item_row(detail_call_list, row, detail_types))
+            if len(batch) == batch_size:
+                yield batch, min(read / size, 1.0)
+                batch = []
+        yield batch, 1.0
+
+class CsvRowIndex:
+    """The rows of a csv file, read on demand through a memory map.
+
+    Only the byte offset of every row is kept in memory, quoted fields
+    spanning several lines are taken into account. Row 0 is the header,
+    row(index) parses a single row.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size > 0:
+                self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._data = b""
+
+        data = self._data
+        size = len(data)
+        self._starts = array.array('q')
+        self._ends = array.array('q')
+
+        start = 0
+        position = 0
+        quotes = 0
+        while position < size:
+            end = data.find(b"\n", position)
+            if end == -1:
+                end = size
+            if data.find(b'"', position, end) != -1:
+                quotes += data[position:end].count(b'"')
+            position = end + 1
+            if quotes % 2 == 0:
+                # blank lines are skipped like csv.reader does
+                if data[start:end].strip():
+                    self._starts.append(start)
+                    self._ends.append(end)
+                start = position
+                quotes = 0
+        if start < size and data[start:size].strip():
+            self._starts.append(start)
+            self._ends.append(size)
+
+        self.header = self.row(0) if len(self._starts) > 0 else []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def row(self, index):
+        text = self._data[self._starts[index]:self._ends[index]].decode("utf-8", errors="replace")
+        return next(csv.reader(io.StringIO(text, newline='')), [])
+
+def parse_product_file(file_path, detail_types):
+    """Parse a products/<id>.csv file into plain tuples.
+
+    Returns the (detail_call, value) pairs of the product and, for every
+    part, the (detail_call, value) pairs as written in the file.
+    """
+    return parse_product_rows(iter_csv_rows(file_path), detail_types)
+
+def parse_product_rows(rows, detail_types):
+    rows = iter(rows)
+
+    product_detail_call_list = next(rows, [])
+    product_row = next(rows, [])
+    details = []
+    for detail_call, value in zip(product_detail_call_list, product_row):
+        if value:
+            try:
+                details.append((detail_call, convert_detail_value(detail_types.get(detail_call), value)))
+            except ValueError:
+                pass
+
+    part_detail_call_list = next(rows, [])
+    parts = [tuple(zip(part_detail_call_list, row)) for row in rows]
+    return tuple(details), parts
+
+def list_product_files(products_folder_path):
+    """Return the sorted paths of the product files in the products folder."""
+    with os.scandir(products_folder_path) as entries:
+        # hidden files are the temporary files of an interrupted save
+        return sorted(entry.path for entry in entries
+                if entry.is_file() and not entry.name.startswith("."))
+
+def parse_product_files(file_paths, detail_types, workers=None, threshold=PRODUCTS_POOL_THRESHOLD):
+    """Parse many product files, in parallel across a process pool when
+    there are at least threshold of them.
+
+    The results are the plain tuples of parse_product_file, in the same
+    order as file_paths, so the GObjects can be built in bulk afterwards.
+    """
+    if workers == None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(file_paths))
+
+    if workers <= 1 or len(file_paths) < threshold:
+        return [parse_product_file(file_path, detail_types) for file_path in file_paths]
+
+    # spawn instead of fork, the parent process is running GTK threads
+    context = multiprocessing.get_context("spawn")
+    chunksize = max(1, len(file_paths) // (workers * 4))
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        return list(executor.map(parse_product_file, file_paths,
+                itertools.repeat(detail_types), chunksize=chunksize))
+
+def fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class SaveTransaction:
+    """Write the files of one save so that a crash can't leave them truncated.
+
+    Every file is written to a hidden temporary file next to it and
+    fsynced, only when all of them have been written they are renamed in
+    place, so an error or a crash while writing leaves the previous files
+    untouched. Use it as a context manager, it commits on success and
+    throws the temporary files away on error.
+    """
+
+    def __init__(self):
+        self._staged = []
+        self._removed = []
+
+    def write_csv(self, file_path, rows):
+        directory, file_name = os.path.split(file_path)
+        try:
+            mode = stat.S_IMODE(os.stat(file_path).st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+
+        fd, temp_path = tempfile.mkstemp(prefix="." + file_name + ".", suffix=".tmp", dir=directory)
+        self._staged.append((temp_path, file_path))
+        with os.fdopen(fd, 'w', newline='\n') as file:
+            os.fchmod(file.fileno(), mode)
+            csv.writer(file).writerows(rows)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def remove(self, file_path):
+        self._removed.append(file_path)
+
+    def commit(self):
+        directories = set()
+        for temp_path, file_path in self._staged:
+            os.replace(temp_path, file_path)
+            directories.add(os.path.dirname(file_path))
+        self._staged = []
+
+        for file_path in self._removed:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            directories.add(os.path.dirname(file_path))
+        self._removed = []
+
+        for directory in directories:
+            fsync_directory(directory)
+
+    def abort(self):
+        for temp_path, file_path in self._staged:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        self._staged = []
+        self._removed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+class InventorySnapshot:
+    """The rows to write for one save of an inventory folder.
+
+    backend is "csv" or "sqlite". items_rows holds the whole inventory.csv,
+    header first, and is None when the items don't need to be written;
+    changed_items and removed_item_ids carry single item changes, upserted
+    in the database or appended to the journal of a csv folder, which
+    only rewrites inventory.csv when it is compacted. preferences_rows is
+    None when the preferences didn't change, products maps the id of every
+    product to write to its rows and removed_product_ids holds the deleted
+    products. full is set when the folder has to be written from scratch.
+    """
+
+    def __init__(self, inventory_path, backend="csv"):
+        self.inventory_path = inventory_path
+        self.backend = backend
+        self.full = False
+        self.item_columns = []
+        self.items_rows = None
+        self.changed_items = {}
+        self.removed_item_ids = set()
+        self.preferences_rows = None
+        self.products = {}
+        self.removed_product_ids = set()
+
+    def merge(self, snapshot):
+        """Fold a newer snapshot of the same folder into this one."""
+        self.full = self.full or snapshot.full
+        if snapshot.items_rows != None:
+            self.items_rows = snapshot.items_rows
+            self.changed_items = {}
+            self.removed_item_ids = set()
+        for item_id in snapshot.removed_item_ids:
+            self.changed_items.pop(item_id, None)
+        self.removed_item_ids -= set(snapshot.changed_items)
+        self.removed_item_ids |= snapshot.removed_item_ids
+        self.changed_items.update(snapshot.changed_items)
+
+        if snapshot.preferences_rows != None:
+            self.preferences_rows = snapshot.preferences_rows
+        for product_id in snapshot.removed_product_ids:
+            self.products.pop(product_id, None)
+        self.removed_product_ids -= set(snapshot.products)
+        self.removed_product_ids |= snapshot.removed_product_ids
+        self.products.update(snapshot.products)
+
+def csv_cell(value):
+    return "" if value == None else str(value)
+
+def apply_item_changes(rows, changed_items, removed_item_ids):
+    """Return the inventory.csv rows with the changed items replaced or
+    appended and the removed ones dropped, items are matched by id.
+
+    The window only sends changes of ids held by a single item and
+    removals of ids no item has anymore, so every row with a removed id
+    is dropped.
+    """
+    rows = iter(rows)
+    header = next(rows, [])
+    id_index = header.index("item_id") if "item_id" in header else 0
+    changed_items = dict(changed_items)
+
+    yield header
+    for row in rows:
+        item_id = row[id_index] if id_index < len(row) else ""
+        if item_id in removed_item_ids:
+            continue
+        if item_id in changed_items:
+            yield changed_items.pop(item_id)
+        else:
+            yield row
+    yield from changed_items.values()
+
+def write_snapshot(snapshot):
+    if snapshot.backend == "sqlite":
+        sqlite_storage.write_snapshot(snapshot.inventory_path + "/" + sqlite_storage.DATABASE_NAME, snapshot)
+        return
+
+    journal_path = snapshot.inventory_path + "/" + JOURNAL_NAME
+
+    if snapshot.items_rows != None:
+        if not snapshot.full:
+            # the journal is dropped by the rewrite, the products it holds
+            # have to be written with it
+            journal = read_journal(snapshot.inventory_path)
+            for product_id, rows in journal.products.items():
+                snapshot.products.setdefault(product_id, rows)
+            snapshot.removed_product_ids |= journal.removed_product_ids - set(snapshot.products)
+        write_csv_files(snapshot.inventory_path, snapshot, apply_item_changes(snapshot.items_rows,
+                snapshot.changed_items, snapshot.removed_item_ids))
+        return
+
+    if snapshot.preferences_rows != None:
+        with SaveTransaction() as transaction:
+            transaction.write_csv(snapshot.inventory_path + "/preferences.csv", snapshot.preferences_rows)
+
+    append_journal(journal_path, snapshot)
+    if os.path.getsize(journal_path) > JOURNAL_COMPACT_SIZE:
+        compact_journal(snapshot.inventory_path)
+
+def write_csv_files(inventory_path, snapshot, items_rows):
+    """Write the csv files of the snapshot and drop the journal they supersede."""
+    products_path = inventory_path + "/products/"
+    os.makedirs(products_path, exist_ok=True)
+
+    with SaveTransaction() as transaction:
+        if items_rows != None:
+            transaction.write_csv(inventory_path + "/inventory.csv", items_rows)
+        if snapshot.preferences_rows != None:
+            transaction.write_csv(inventory_path + "/preferences.csv", snapshot.preferences_rows)
+        for product_id, rows in snapshot.products.items():
+            transaction.write_csv(products_path + product_id + ".csv", rows)
+        for product_id in snapshot.removed_product_ids:
+            transaction.remove(products_path + product_id + ".csv")
+        transaction.remove(inventory_path + "/" + JOURNAL_NAME)
+
+def append_journal(journal_path, snapshot):
+    """Append the changes of a partial snapshot to the journal as json lines.
+
+    The records of one save are closed by a commit record, a save cut
+    short by a crash leaves no commit and is ignored by read_journal. What
+    it left after the last commit is cut off before appending, so a torn
+    line can't swallow the first record of the next save.
+    """
+    records = []
+    for item_id, row in snapshot.changed_items.items():
+        records.append({"op": "item", "id": item_id, "row": [csv_cell(value) for value in row]})
+    for item_id in snapshot.removed_item_ids:
+        records.append({"op": "remove_item", "id": item_id})
+    for product_id, rows in snapshot.products.items():
+        records.append({"op": "product", "id": product_id,
+                "rows": [[csv_cell(value) for value in row] for row in rows]})
+    for product_id in snapshot.removed_product_ids:
+        records.append({"op": "remove_product", "id": product_id})
+    if not records:
+        return
+    records.append({"op": "commit", "item_columns": snapshot.item_columns})
+
+    created = False
+    try:
+        file = open(journal_path, 'r+b')
+    except FileNotFoundError:
+        file = open(journal_path, 'w+b')
+        created = True
+    with file:
+        file.seek(committed_length(file))
+        file.truncate()
+        for record in records:
+            file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+        file.flush()
+        os.fsync(file.fileno())
+    if created:
+        fsync_directory(os.path.dirname(journal_path))
+
+def committed_length(file):
+    """The length of the journal up to the end of its last commit record."""
+    file.seek(0)
+    length = 0
+    position = 0
+    for line in file:
+        position += len(line)
+        if not line.endswith(b"\n"):
+            break
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("op") == "commit":
+            length = position
+    return length
+
+class Journal:
+    """The committed changes recorded in the journal of an inventory folder."""
+
+    def __init__(self):
+        self.item_columns = []
+        self.items = {}
+        self.removed_item_ids = set()
+        self.products = {}
+        self.removed_product_ids = set()
+
+    def is_empty(self):
+        return not (self.items or self.removed_item_ids or self.products or self.removed_product_ids)
+
+    def apply(self, record):
+        op = record.get("op")
+        if op == "item":
+            self.removed_item_ids.discard(record["id"])
+            self.items[record["id"]] = record["row"]
+        elif op == "remove_item":
+            self.items.pop(record["id"], None)
+            self.removed_item_ids.add(record["id"])
+        elif op == "product":
+            self.removed_product_ids.discard(record["id"])
+            self.products[record["id"]] = record["rows"]
+        elif op == "remove_product":
+            self.products.pop(record["id"], None)
+            self.removed_product_ids.add(record["id"])
+        elif op == "commit":
+            self.item_columns = record.get("item_columns", self.item_columns)
+
+def read_journal(inventory_path):
+    journal = Journal()
+    pending = []
+    try:
+        file = open(inventory_path + "/" + JOURNAL_NAME, 'r')
+    except FileNotFoundError:
+        return journal
+
+    with file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a torn write, the save it belongs to never committed
+                pending = []
+                continue
+            pending.append(record)
+            if record.get("op") == "commit":
+                for pending_record in pending:
+                    journal.apply(pending_record)
+                pending = []
+    # the records of a save cut short at the end are left out
+    return journal
+
+def replay_item_batches(batches, journal, detail_types):
+    """Apply the journal on top of the batches of iter_item_batches."""
+    if journal.is_empty():
+        yield from batches
+        return
+
+    changed_items = dict(journal.items)
+    for batch, fraction in batches:
+        replayed = []
+        for details, custom_values in batch:
+            item_id = next((value for detail_call, value in details if detail_call == "item_id"), "")
+            if item_id in journal.removed_item_ids:
+                continue
+            if item_id in changed_items:
+                replayed.append(parse_item_row(journal.item_columns, changed_items.pop(item_id), detail_types))
+            else:
+                replayed.append((details, custom_values))
+        yield replayed, fraction
+
+    yield [parse_item_row(journal.item_columns, row, detail_types) for row in changed_items.values()], 1.0
+
+def replay_products(products, journal, detail_types):
+    """Apply the journal on top of the results of parse_product_files."""
+    if journal.is_empty():
+        return products
+
+    changed_products = dict(journal.products)
+    replayed = []
+    for details, parts in products:
+        product_id = next((value for detail_call, value in details if detail_call == "product_id"), "")
+        if product_id in journal.removed_product_ids:
+            continue
+        if product_id in changed_products:
+            replayed.append(parse_product_rows(changed_products.pop(product_id), detail_types))
+        else:
+            replayed.append((details, parts))
+    for rows in changed_products.values():
+        replayed.append(parse_product_rows(rows, detail_types))
+    return replayed
+
+def compact_journal(inventory_path):
+    """Fold the journal into fresh csv files and remove it."""
+    journal = read_journal(inventory_path)
+    items_list_path = inventory_path + "/inventory.csv"
+
+    snapshot = InventorySnapshot(inventory_path)
+    snapshot.products = journal.products
+    snapshot.removed_product_ids = journal.removed_product_ids
+
+    if os.path.exists(items_list_path):
+        items_rows = iter_csv_rows(items_list_path)
+    else:
+        items_rows = [journal.item_columns]
+    write_csv_files(inventory_path, snapshot, list(apply_item_changes(items_rows,
+            journal.items, journal.removed_item_ids)))
+
+class InventoryWriter(threading.Thread):
+    """Thread writing the submitted snapshots to disk, one after the other.
+
+    Snapshots of the same folder submitted while the thread is busy are
+    merged, so back-to-back saves are written once. on_written(snapshot,
+    error) is called from this thread after every write, error being
+    None when the write succeeded.
+    """
+
+    def __init__(self, on_written):
+        super().__init__(daemon=True)
+
+        self._on_written = on_written
+        self._pending = []
+        self._writing = False
+        self._condition = threading.Condition()
+
+    def submit(self, snapshot):
+        with self._condition:
+            last = self._pending[-1] if self._pending else None
+            if last != None and last.inventory_path == snapshot.inventory_path and last.backend == snapshot.backend:
+                self._pending[-1].merge(snapshot)
+            else:
+                self._pending.append(snapshot)
+            self._condition.notify_all()
+
+    def flush(self):
+        """Block until every submitted snapshot has been written."""
+        with self._condition:
+            while self._pending or self._writing:
+                self._condition.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                snapshot = self._pending.pop(0)
+                self._writing = True
+
+            error = None
+            try:
+                write_snapshot(snapshot)
+            except Exception as e:
+                error = e
+
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+            self._on_written(snapshot, error)
+
+def inventory_cache_path(cache_dir, inventory_path):
+    """The cache file of an inventory folder, named after its absolute path."""
+    digest = hashlib.sha1(os.path.abspath(inventory_path).encode()).hexdigest()
+    return os.path.join(cache_dir, digest + ".cache")
+
+def inventory_cache_key(inventory_path, item_detail_types, product_detail_types):
+    """Identify the contents of a csv inventory folder by the sizes and
+    modification times of its files."""
+    files = []
+    for name in ["inventory.csv", "preferences.csv", JOURNAL_NAME]:
+        try:
+            file_stat = os.stat(inventory_path + "/" + name)
+            files.append((name, file_stat.st_size, file_stat.st_mtime_ns))
+        except FileNotFoundError:
+            files.append((name, None, None))
+
+    try:
+        with os.scandir(inventory_path + "/products/") as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                if entry.is_file() and not entry.name.startswith("."):
+                    file_stat = entry.stat()
+                    files.append(("products/" + entry.name, file_stat.st_size, file_stat.st_mtime_ns))
+    except FileNotFoundError:
+        pass
+
+    return (CACHE_VERSION, os.path.abspath(inventory_path), tuple(files),
+            tuple(sorted(item_detail_types.items())), tuple(sorted(product_detail_types.items())))
+
+def load_inventory_cache(cache_path, cache_key):
+    """Return the cached (products, preferences_rows, items) of the folder,
+    or None when there is no cache or the files changed since it was written."""
+    try:
+        with open(cache_path, 'rb') as file:
+            # the key is pickled on its own so a stale cache is rejected
+            # without loading the rest
+            if pickle.load(file) != cache_key:
+                return None
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print("Ignoring the inventory cache: " + str(e))
+        return None
+
+def pack_items(items):
+    """Turn the (details, custom_values) of the items into columns, rows of
+    plain values unpickle several times faster than the detail pairs."""
+    columns = []
+    indexes = {}
+    rows = []
+    for details, custom_values in items:
+        row = [None] * len(columns)
+        for detail_call, value in details:
+            index = indexes.get(detail_call)
+            if index == None:
+                index = indexes[detail_call] = len(columns)
+                columns.append(detail_call)
+                row.append(None)
+            row[index] = value
+        rows.append(tuple(row))
+    return columns, rows, [custom_values for details, custom_values in items]
+
+def save_inventory_cache(cache_path, cache_key, products, preferences_rows, items):
+    directory = os.path.dirname(cache_path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(cache_key, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump((products, preferences_rows, pack_items(items)), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+def iter_cached_batches(packed_items, batch_size):
+    """Rebuild the cached items in batches like iter_item_batches."""
+    columns, rows, custom_values = packed_items
+    total = len(rows) or 1
+    for start in range(0, len(rows), batch_size):
+        batch = [(tuple((detail_call, value) for detail_call, value in zip(columns, row) if value != None), custom)
+                for row, custom in zip(rows[start:start + batch_size], custom_values[start:start + batch_size])]
+        yield batch, min((start + batch_size) / total, 1.0)
+    yield [], 1.0
@@ -0,0 +1,83 @@
+# units.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+import functools
+
+# Values are stored as a number and one of these units, like "4.7 kΩ"
+UNITS_OF_MEASURE = ["  ",
+               "F", "nF", "uF", "pF",
+               "MΩ", "kΩ", "Ω", "mΩ", "μΩ", "nΩ",
+               "H", "mH", "μH", "nH",
+               "V", "mV", "μV",
+               "A", "mA", "μA",
+               "W", "mW",
+               "Hz", "kHz", "MHz", "GHz",
+               "kg", "g",
+               "m", "mm", "cm", "km",
+               "MV", "kV", "V", "mV", "μV", "nV",
+               "inches", "feet",
+               "°"]
+
+PREFIXES = {"G": 1e9, "M": 1e6, "k": 1e3, "c": 1e-2, "m": 1e-3, "μ": 1e-6, "u": 1e-6, "n": 1e-9, "p": 1e-12}
+
+def unit_scales(units):
+    """Map every unit to its base unit and the factor converting to it, a
+    unit being a prefix followed by another unit of the table."""
+    scales = {}
+    for unit in units:
+        unit = unit.strip()
+        if len(unit) > 1 and unit[0] in PREFIXES and unit[1:] in units:
+            scales[unit] = (unit[1:], PREFIXES[unit[0]])
+        else:
+            scales[unit] = (unit, 1.0)
+    return scales
+
+SCALES = unit_scales(UNITS_OF_MEASURE)
+
+@functools.lru_cache(maxsize=4096)
+def normalize(text):
+    """Return the magnitude in the base unit and the base unit of a value
+    like "4.7 kΩ", (4700.0, "Ω"), or None if it doesn't start with a
+    number. Plain numbers have "" as unit."""
+    number, space, unit = text.strip().partition(" ")
+    try:
+        number = float(number)
+    except ValueError:
+        return None
+    unit = unit.strip()
+    base, factor = SCALES.get(unit, (unit, 1.0))
+    return number * factor, base
+
+def measure(value):
+    """Like normalize for any value, None included, numbers having ""
+    as unit."""
+    if value == None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value), ""
+    return normalize(str(value))
+
+def magnitude(value, base=None):
+    """The normalized magnitude of value, None when it is not a number or,
+    if base is given, its unit is not base. A base of "" only takes plain
+    numbers."""
+    measured = measure(value)
+    if measured == None or (base != None and measured[1] != base):
+        return None
+    return measured[0]
@@ -21,20 +21,30 @@ from gi.repository import GObject
 from gi.repository import Adw
 from gi.repository import Gtk, Gio, GLib
 
+import collections
 import datetime
 import random
 import csv
 import gettext
+import itertools
 import locale
 import threading
 from os import path
 from os.path import abspath, dirname, join, realpath
 import os
-import inspect
 import time
 import string
 import webbrowser
 
+from . import sqlite_storage
+from . import storage
+from .lazy_item_store import LazyItemStore
+from . import records
+from . import aggregates
+from . import search
+from . import sorting
+from . import units
+
 class ListString(GObject.Object):
     __gtype_name__ = 'ListString'
 
@@ -105,33 +115,56 @@ class ImportItem(GObject.Object):
             text += " " + str(detail)
         return text
 
+def detail_attributes(obj):
+    # Maps the detail names of the class of obj to the attributes holding
+    # them, built once per class from its record fields and the attributes
+    # set in its __init__
+    cls = type(obj)
+    attributes = cls.__dict__.get("_detail_attributes")
+    if attributes == None:
+        names = list(vars(obj)) + [name for name, value in vars(cls).items() if isinstance(value, records.Field)]
+        attributes = dict((name[1:], name) for name in names if name.startswith("_") and name not in ("_row", "_key"))
+        cls._detail_attributes = attributes
+    return attributes
+
+# the details of every Part live in the columns of part_records, the
+# Part only holds its row
+part_records = records.RecordStore({
+    "_part_last_position": None,
+    "_part_type": None,
+    "_part_id": None,
+    "_part_category": None,
+    "_part_name": None,
+    "_part_stock": None,
+    "_part_package": None,
+    "_part_cost": None,
+    "_part_value": None,
+    "_part_manufacturer": None,
+    "_part_description": None,
+    "_part_seller": None,
+    "_part_stock_reserved": None,
+    "_part_stock_allocated": None,
+    "_part_stock_planned": None,
+    "_part_stock_on_order": None,
+    "_part_stock_for_sale": None,
+    "_part_storage": None,
+    "_part_part_number": None,
+    "_used_quantity": None,
+    "_part_datasheet": None,
+})
+
 class Part(GObject.Object):
     __gtype_name__ = "Part"
+    # cached by sorting.sort_key, dropped by set_detail
+    sort_keys = None
 
     def __init__(self):
         super().__init__()
 
-        self._part_last_position = None
-        self._part_type = None
-        self._part_id = None
-        self._part_category = None
-        self._part_name = None
-        self._part_stock = None
-        self._part_package = None
-        self._part_cost = None
-        self._part_value = None
-        self._part_manufacturer = None
-        self._part_description = None
-        self._part_seller = None
-        self._part_stock_reserved = None
-        self._part_stock_allocated = None
-        self._part_stock_planned = None
-        self._part_stock_on_order = None
-        self._part_stock_for_sale = None
-        self._part_storage = None
-        self._part_part_number = None
-        self._used_quantity = None
-        self._part_datasheet = None
+        self._row = part_records.new_row()
+
+    def __del__(self):
+        part_records.free_row(self._row)
 
     def set_part_last_position(self, value):
         self._part_last_position = value
@@ -226,46 +259,57 @@ class Part(GObject.Object):
         return getattr(self, name, None)
 
     def set_detail(self, detail_name, value):
-        attributes = inspect.getmembers(self, lambda a: not inspect.isroutine(a))
-        for attr_name, _ in attributes:
-            if attr_name == f"_{detail_name}":
-                setattr(self, f"_{detail_name}", value)
-                return
-
-        raise ValueError(f"Invalid detail name: {detail_name}")
+        attribute = detail_attributes(self).get(detail_name)
+        if attribute == None:
+            raise ValueError(f"Invalid detail name: {detail_name}")
+        setattr(self, attribute, value)
+        self.sort_keys = None
 
     def __repr__(self):
         text = "Part: "
         return text + (self.part_id or "") + " " + (self.part_name or "no name") + " " + (str(self._part_last_position) or "")
 
+records.install_fields(Part, part_records)
+
+# the details of every Product live in the columns of product_records, the
+# Product only holds its row
+product_records = records.RecordStore({
+    "_product_id": None,
+    "_product_category": None,
+    "_product_name": None,
+    "_product_package": None,
+    "_product_cost": None,
+    "_product_value": None,
+    "_product_manufacturer": None,
+    "_product_description": None,
+    "_product_creation": None,
+    "_product_modification": None,
+    "_product_seller": None,
+    "_product_selling_price": None,
+    "_product_stock_reserved": 0,
+    "_product_stock_allocated": 0,
+    "_product_stock_planned": 0,
+    "_product_stock_on_order": 0,
+    "_product_stock_for_sale": 0,
+    "_product_storage": None,
+    "_product_part_number": None,
+    "_product_revision": None,
+})
+
 class Product(GObject.Object):
     __gtype_name__ = "Product"
+    # cached by sorting.sort_key, dropped by set_detail
+    sort_keys = None
 
     def __init__(self):
         super().__init__()
 
-        self._product_id = None
-        self._product_category = None
-        self._product_name = None
-        self._product_package = None
-        self._product_cost = None
-        self._product_value = None
-        self._product_manufacturer = None
-        self._product_description = None
-        self._product_creation = None
-        self._product_modification = None
-        self._product_seller = None
-        self._product_selling_price = None
-        self._product_stock_reserved = 0
-        self._product_stock_allocated = 0
-        self._product_stock_planned = 0
-        self._product_stock_on_order = 0
-        self._product_stock_for_sale = 0
-        self._product_storage = None
-        self._product_part_number = None
-        self._product_revision = None
-
+        self._row = product_records.new_row()
         self._product_parts_list = Gio.ListStore(item_type=Part)
+        self._dirty = False
+
+    def __del__(self):
+        product_records.free_row(self._row)
 
     @GObject.Property(type=str)
     def product_revision(self):
@@ -364,58 +408,96 @@ class Product(GObject.Object):
 
     def append_part(self, part):
         self._product_parts_list.append(part)
+        self._dirty = True
+
+    def is_dirty(self):
+        return self._dirty
+
+    def set_dirty(self, dirty):
+        self._dirty = dirty
 
     def get_detail(self, name):
         return getattr(self, name, None)
 
     def set_detail(self, detail_name, value):
-        attributes = inspect.getmembers(self, lambda a: not inspect.isroutine(a))
-
         if detail_name == "product_stock":
             return
 
-        for attr_name, _ in attributes:
-            if attr_name == f"_{detail_name}":
-                setattr(self, f"_{detail_name}", value)
-                return
-
-        raise ValueError(f"Invalid detail name: {detail_name}")
+        attribute = detail_attributes(self).get(detail_name)
+        if attribute == None:
+            raise ValueError(f"Invalid detail name: {detail_name}")
+        setattr(self, attribute, value)
+        self.sort_keys = None
+        self._dirty = True
 
     def __repr__(self):
         text = "Product: "
         return text + self.product_id
 
 
+records.install_fields(Product, product_records)
+
+# the details of every Item live in the columns of item_records, the
+# Item only holds its row. The numbers are kept in typed columns. Rows
+# are reused once their Item is collected, the search indexes and caches
+# key the items by _key, never reused
+item_keys = itertools.count()
+# the items changed since they were last loaded or saved, by key, so a
+# save doesn't have to look at every item to find them
+unsaved_items = {}
+item_records = records.RecordStore({
+    "_item_id": None,
+    "_item_category": None,
+    "_item_name": None,
+    "_item_package": None,
+    "_item_cost": None,
+    "_item_value": None,
+    "_item_manufacturer": None,
+    "_item_description": None,
+    "_item_creation": None,
+    "_item_modification": None,
+    "_item_selling_price": None,
+    "_item_stock_reserved": 0,
+    "_item_stock_allocated": 0,
+    "_item_stock_planned": 0,
+    "_item_stock_on_order": 0,
+    "_item_stock_for_sale": 0,
+    "_item_storage": None,
+    "_unit_of_measure": None,
+    "_item_part_number": None,
+    "_item_seller": None,
+    "_item_low_stock": None,
+    "_item_buy_link": None,
+    "_item_datasheet": None,
+    "_item_custom_values_list": (),
+    "_key": None,
+    "_dirty": False,
+    "_dirty_callback": None,
+    # cached by sorting.sort_key, dropped by set_detail
+    "sort_keys": None,
+}, {
+    "_item_cost": 'd',
+    "_item_selling_price": 'd',
+    "_item_stock_reserved": 'q',
+    "_item_stock_allocated": 'q',
+    "_item_stock_planned": 'q',
+    "_item_stock_on_order": 'q',
+    "_item_stock_for_sale": 'q',
+    "_item_low_stock": 'q',
+    "_key": 'q',
+})
+
 class Item(GObject.Object):
     __gtype_name__ = "Item"
 
     def __init__(self, length):
         super().__init__()
 
-        self._item_id = None
-        self._item_category = None
-        self._item_name = None
-        self._item_package = None
-        self._item_cost = None
-        self._item_value = None
-        self._item_manufacturer = None
-        self._item_description = None
-        self._item_creation = None
-        self._item_modification = None
-        self._item_selling_price = None
-        self._item_stock_reserved = 0
-        self._item_stock_allocated = 0
-        self._item_stock_planned = 0
-        self._item_stock_on_order = 0
-        self._item_stock_for_sale = 0
-        self._item_storage = None
-        self._unit_of_measure = None
-        self._item_part_number = None
-        self._item_seller = None
-        self._item_low_stock = None
-        self._item_buy_link = None
-        self._item_datasheet = None
-        self._item_custom_values_list = []
+        self._row = item_records.new_row()
+        self._key = next(item_keys)
+
+    def __del__(self):
+        item_records.free_row(self._row)
 
     @GObject.Property(type=str)
     def item_datasheet(self):
@@ -523,32 +605,76 @@ class Item(GObject.Object):
     def custom_values_list(self):
         return self._item_custom_values_list
 
+    @property
+    def item_custom_info(self):
+        # the custom info as a single text, for the search
+        return " ".join(str(name) + " " + str(value) for name, value in self._item_custom_values_list)
+
     def set_custom_values_at_index(self, index, value):
         self._item_custom_values_list[index] = value
+        self.set_dirty(True)
 
     def append_custom_value(self, name, value):
-        self._item_custom_values_list.append([name, value])
+        custom_values = self._item_custom_values_list
+        if custom_values == ():
+            # the rows share the empty default, the item gets its own list
+            custom_values = self._item_custom_values_list = []
+        custom_values.append([name, value])
+        self.set_dirty(True)
+
+    def is_dirty(self):
+        return self._dirty
+
+    def set_dirty(self, dirty):
+        self._dirty = dirty
+        if dirty:
+            unsaved_items[self._key] = self
+        else:
+            unsaved_items.pop(self._key, None)
+        if dirty and self._dirty_callback != None:
+            callback = self._dirty_callback
+            self._dirty_callback = None
+            callback(self)
+
+    def set_dirty_callback(self, callback):
+        # called once, the first time the item changes
+        self._dirty_callback = callback
 
     def get_detail(self, name):
         return getattr(self, name, None)
 
     def set_detail(self, detail_name, value):
-        attributes = inspect.getmembers(self, lambda a: not inspect.isroutine(a))
-
         if detail_name == "item_quantity":
             return
 
-        for attr_name, _ in attributes:
-            if attr_name == f"_{detail_name}":
-                setattr(self, f"_{detail_name}", value)
-                return
-
-        raise ValueError(f"Invalid detail name: {detail_name}")
+        attribute = detail_attributes(self).get(detail_name)
+        if attribute == None:
+            raise ValueError(f"Invalid detail name: {detail_name}")
+        setattr(self, attribute, value)
+        self.sort_keys = None
+        self.set_dirty(True)
 
     def __repr__(self):
         text = "Item: "
         return text + self.item_id
 
+records.install_fields(Item, item_records)
+
+class InventorySummary(GObject.Object):
+    __gtype_name__ = "InventorySummary"
+
+    # running totals of the inventory, the dashboard tiles are bound to them
+    items_count = GObject.Property(type=int, default=0)
+    inventory_value = GObject.Property(type=float, default=0)
+    low_stock_count = GObject.Property(type=int, default=0)
+    out_of_stock_count = GObject.Property(type=int, default=0)
+    products_count = GObject.Property(type=int, default=0)
+
+    def update(self, name, value):
+        # only notify the properties that really changed
+        if self.get_property(name) != value:
+            self.set_property(name, value)
+
 class InventarioWindow(Adw.ApplicationWindow):
     __gtype_name__ = 'InventarioWindow'
 
@@ -646,19 +772,10 @@ class InventarioWindow(Adw.ApplicationWindow):
                     ["Created on", "item_creation", "DATE"],
                     ["Modified on", "item_modification", "date"],
                     ]
-    units_of_measure = ["  ",
-                   "F", "nF", "uF", "pF",
-                   "MΩ", "kΩ", "Ω", "mΩ", "μΩ", "nΩ",
-                   "H", "mH", "μH", "nH",
-                   "V", "mV", "μV",
-                   "A", "mA", "μA",
-                   "W", "mW",
-                   "Hz", "kHz", "MHz", "GHz",
-                   "kg", "g",
-                   "m", "mm", "cm", "km",
-                   "MV", "kV", "V", "mV", "μV", "nV",
-                   "inches", "feet",
-                   "°"]
+    # the details the search bar can look in
+    search_details = details_names + [["Custom Info", "item_custom_info", "str"]]
+
+    units_of_measure = units.UNITS_OF_MEASURE
 
     items_categories = ["ELECTRONICS", "MECHANICAL", "CONSUMABLE"]
     products_categories = ["ELECTRONICS", "MECHANICAL"]
@@ -695,18 +812,84 @@ class InventarioWindow(Adw.ApplicationWindow):
 
     details_lenght = len(details_names)
 
+    item_detail_types = dict((detail[1], detail[2]) for detail in details_names)
+    product_detail_types = dict((detail[1], detail[2]) for detail in product_details_names)
+
+    # number of items parsed by the loading thread for every idle callback
+    load_chunk_size = 500
+    load_cancellable = None
+
+    # the folder the shown inventory was loaded from or last saved to, the
+    # only one saved to without choosing it in the Save As dialog
+    current_inventory_path = ""
+    # what changed since the inventory was last loaded from or saved to
+    # saved_inventory_path, items and products also keep their own flag
+    saved_inventory_path = ""
+    inventory_backend = "csv"
+    items_dirty = False
+    preferences_dirty = False
+
+    # formats an inventory folder can be saved in, see the storage-backend key
+    storage_backends = ["csv", "sqlite"]
+
     id_lenght = 5
 
     dashboard_width = 4
     dashboard_height = 10
 
     filter_parameters = []
+    search_query = search.Query([])
+    # keys of the items that can match search_query, None when every item can
+    search_candidates = None
+    # when set, search_candidates are exactly the matching items
+    search_candidates_exact = False
+    # bumped by every change of the items, to drop outdated background searches
+    search_generation = 0
+    # searches of at least this many items the indexes can't narrow are
+    # matched in a worker thread, measured by benchmarks/search_filter.py
+    background_search_items = 20000
+    text_index = None
+    numeric_index = None
+    # the indexes built by search_index, by name
+    index_types = {"text_index": (search.TrigramIndex, search.INDEXED_DETAILS),
+            "numeric_index": (search.NumericIndex, search.NUMERIC_INDEXED_DETAILS)}
+    # the page and search the items were last filtered with
+    filtered_state = None
+    # the text cell of a column bound by GTK, see new_builder_factory
+    builder_factory_ui = """<?xml version="1.0" encoding="UTF-8"?>
+<interface>
+  <template class="{cell_class}">
+    <property name="child">
+      <object class="GtkLabel">
+        <property name="xalign">0</property>
+        <property name="width-request">130</property>
+        <property name="halign">start</property>
+        <binding name="label">
+          <lookup name="{property_name}" type="{type_name}">
+            <lookup name="item" type="GtkTreeListRow">
+              <lookup name="item">{cell_class}</lookup>
+            </lookup>
+          </lookup>
+        </binding>
+      </object>
+    </property>
+  </template>
+</interface>"""
+
+    category_css_classes = [["ELECTRONICS", "electronics"], ["MECHANICAL", "mechanical"], ["CONSUMABLE", "consumable"]]
+
+    # milliseconds without typing before a live search runs
+    live_search_delay = 250
+    live_search_source = None
+    filter_changes = {"more_strict": Gtk.FilterChange.MORE_STRICT,
+            "less_strict": Gtk.FilterChange.LESS_STRICT, "different": Gtk.FilterChange.DIFFERENT}
 
     selected_item = 0
     selected_product = 0
     last_page = 1
 
     dashboard_widgets=["Simple value", "Progress bar"]
+    dashboard_box = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -714,6 +897,20 @@ class InventarioWindow(Adw.ApplicationWindow):
         self.settings = Gio.Settings.new('io.github.nokse22.inventario')
         self.last_page = self.settings.get_int("last-page")
 
+        self.deleted_item_ids = []
+        self.deleted_product_ids = []
+        # page -> (search_query, {item key: shown}) of the last filtering
+        self.filter_cache = {}
+        self.cell_formatters = {}
+
+        # read for every category cell bound, so kept up to date here
+        self.coloured_categories = self.settings.get_boolean("enable-coloured-categories")
+        self.settings.connect("changed::enable-coloured-categories", self.on_coloured_categories_changed)
+        self.settings.connect("changed::currency", self.on_currency_changed)
+
+        self.writer = storage.InventoryWriter(self.on_snapshot_written)
+        self.writer.start()
+
         if self.settings.get_boolean("window-save"):
             self.settings.bind(
                 "window-width", self, "default-width", Gio.SettingsBindFlags.DEFAULT
@@ -829,7 +1026,7 @@ class InventarioWindow(Adw.ApplicationWindow):
         add_search_option_button = Gtk.Button(icon_name="list-add-symbolic", hexpand=True)
 
         detail_just_names = []
-        for detail in self.details_names:
+        for detail in self.search_details:
             detail_just_names.append(detail[0])
         self.search_selector = self.new_drop_down_from_strings(detail_just_names)
         self.search_selector.set_selected(2)
@@ -883,7 +1080,12 @@ class InventarioWindow(Adw.ApplicationWindow):
         self.content_scrolled_window.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
         self.toast_overlay = Adw.ToastOverlay()
         self.toast_overlay.set_child(self.content_scrolled_window)
-        self.content_box.append(self.toast_overlay)
+
+        self.load_progress_bar = Gtk.ProgressBar(css_classes=["osd"], valign=Gtk.Align.START, visible=False)
+        content_overlay = Gtk.Overlay()
+        content_overlay.set_child(self.toast_overlay)
+        content_overlay.add_overlay(self.load_progress_bar)
+        self.content_box.append(content_overlay)
 
         self.action_bar = Gtk.ActionBar()
         self.action_bar_revealer = Gtk.Revealer(transition_type=4)
@@ -916,10 +1118,25 @@ class InventarioWindow(Adw.ApplicationWindow):
         self.right_pane_content_box.append(self.info_panel)
         self.model = Gio.ListStore(item_type=Item)
 
+        # numeric columns of the items for the dashboard, in model order
+        self.item_aggregates = aggregates.ItemAggregates()
+        # the ids of the items in model order and how many items have each
+        self.item_ids = []
+        self.item_id_counts = collections.Counter()
+        # the keys of the items in model order and their positions, None
+        # until needed again after a splice moved some of the items
+        self.item_keys = []
+        self.item_positions = {}
+        # the search indexes being built or kept up to date, by name
+        self.index_builds = {}
+        self.index_build_source = None
+        self.summary = InventorySummary()
+        self.items_changed_handler = self.model.connect("items-changed", self.on_items_model_changed)
+
         for i in range(len(self.sidebar_options)):
             self.sidebar_navigation_listBox.append(Gtk.Label(label = self.sidebar_options[i], xalign=0))
 
-        for detail in self.details_names:
+        for detail in self.search_details:
             self.filter_parameters.append(["", detail[1]])
 
         # Items column view
@@ -959,6 +1176,7 @@ class InventarioWindow(Adw.ApplicationWindow):
         # products column view
 
         self.products_model = Gio.ListStore(item_type=Product)
+        self.products_model.connect("items-changed", self.on_products_model_changed)
 
         self.products_cv = Gtk.ColumnView(single_click_activate=False, reorderable=True, css_classes=["flat", "data-table"])
 
@@ -983,7 +1201,7 @@ class InventarioWindow(Adw.ApplicationWindow):
         self.products_cv.connect("activate", self.on_column_view_activated)
 
         for detail in self.product_details_names:
-            self.add_column(detail[0], detail[1], detail[2], self.products_cv)
+            self.add_column(detail[0], detail[1], detail[2], self.products_cv, Product)
 
         products_column_visibility_popover = Gtk.Popover(halign=Gtk.Align.END, has_arrow=False)
         products_column_visibility_popover.set_position(Gtk.PositionType.TOP)
@@ -1022,7 +1240,7 @@ class InventarioWindow(Adw.ApplicationWindow):
         detail_just_names = []
         search_entry.connect("activate", self.filter_rows)
         search_entry.connect("changed", self.entry_text_inserted)
-        for detail in self.details_names:
+        for detail in self.search_details:
             detail_just_names.append(detail[0])
         search_selector = self.new_drop_down_from_strings(detail_just_names)
         search_selector.set_enable_search(True)
@@ -1048,29 +1266,57 @@ class InventarioWindow(Adw.ApplicationWindow):
         if not "!" in text:
             entry.remove_css_class("success")
 
-    def filter_rows(self, btn):
+        if self.settings.get_boolean("live-search"):
+            # search once the typing pauses, every key restarts the wait
+            self.cancel_live_search()
+            self.live_search_source = GLib.timeout_add(self.live_search_delay, self.on_live_search_timeout)
+
+    def cancel_live_search(self):
+        if self.live_search_source != None:
+            GLib.source_remove(self.live_search_source)
+            self.live_search_source = None
+
+    def on_live_search_timeout(self):
+        self.live_search_source = None
+        # the filter model checks the items in chunks on the idle loop and
+        # starts over if the next search comes before it is done
+        self.filter_rows(None, incremental=True)
+        return False
+
+    def filter_rows(self, btn, incremental=False):
         # print("filter rows")
+        self.cancel_live_search()
         self.filter_parameters = []
-        for detail in self.details_names:
+        for detail in self.search_details:
             self.filter_parameters.append(["", detail[1]])
 
         for child_index, child in enumerate(self.search_bar_box):
             if child_index == 0:
                 continue
             condition = child.get_child().get_first_child().get_text()
-            detail_call = self.details_names[child.get_child().get_first_child().get_next_sibling().get_selected()][1]
-            for index, detail in enumerate(self.details_names):
+            detail_call = self.search_details[child.get_child().get_first_child().get_next_sibling().get_selected()][1]
+            for index, detail in enumerate(self.search_details):
                 if detail[1] == detail_call:
                     self.filter_parameters[index][0] = condition
-        self.row_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.search_query = search.compile_query(self.filter_parameters)
+        self.search_candidates = self.find_search_candidates(self.search_query)
+        self.search_candidates_exact = False
+        if self.search_candidates == None and self.match_search_in_background(incremental):
+            # on_search_matched refilters
+            self.update_sidebar_item_info()
+            return
+        self.refilter(incremental)
 
         self.update_sidebar_item_info()
 
     def delete_filter_rows(self, btn=None):
         self.filter_parameters = []
-        for detail in self.details_names:
+        for detail in self.search_details:
             self.filter_parameters.append(["", detail[1]])
-        self.row_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.search_query = search.compile_query(self.filter_parameters)
+        self.search_candidates = None
+        self.search_candidates_exact = False
+        self.refilter()
 
         childs_to_remove = []
         for child_index, child in enumerate(self.search_bar_box):
@@ -1082,58 +1328,202 @@ class InventarioWindow(Adw.ApplicationWindow):
                 childs_to_remove.append(child)
         for child in childs_to_remove:
             self.search_bar_box.remove(child)
+        self.cancel_live_search()
 
-    def filter(self, item):
-        show = True
+    def filter_page(self):
+        if self.last_page == self.low_stock_index:
+            return "low_stock"
+        if self.last_page == self.out_of_stock_index:
+            return "out_of_stock"
+        return "all"
+
+    def refilter(self, incremental=False):
+        # tell the filter how the shown items changed since the last
+        # filtering, so it only checks the items that can change
+        self.tree_model_filter.set_incremental(incremental)
+        state = (self.filter_page(), self.search_query)
+        previous = self.filtered_state
+        self.filtered_state = state
+        if previous == None:
+            self.row_filter.changed(Gtk.FilterChange.DIFFERENT)
+            return
+
+        if previous[0] == state[0]:
+            page_change = "same"
+        elif previous[0] == "all":
+            page_change = "more_strict"
+        elif state[0] == "all":
+            page_change = "less_strict"
+        else:
+            page_change = "different"
+        query_change = search.query_change(previous[1], state[1])
+
+        if page_change == "same":
+            change = query_change
+        elif query_change == "same" or query_change == page_change:
+            change = page_change
+        else:
+            change = "different"
+
+        if change != "same":
+            self.row_filter.changed(self.filter_changes[change])
 
+    def filter(self, item):
+        # a lazily loaded row gets a new Item, and key, every time it is
+        # built again, its results would only pile up in the cache
+        if not isinstance(item, Item) or isinstance(self.model, LazyItemStore):
+            return self.filter_item(item)
+
+        # the results are kept per page until the search or the items change
+        page = self.filter_page()
+        cached = self.filter_cache.get(page)
+        if cached == None or cached[0] is not self.search_query:
+            cached = self.filter_cache[page] = (self.search_query, {})
+        shown = cached[1].get(item._key)
+        if shown == None:
+            shown = cached[1][item._key] = self.filter_item(item)
+        return shown
+
+    def filter_item(self, item):
+        is_item = isinstance(item, Item)
+
+        # the stock pages use the sets of the numeric index when it is built
         if self.last_page == self.low_stock_index:
-            if int(item.get_detail("item_quantity") or 0) < int(item.get_detail("item_low_stock") or 0):
-                pass
-            else:
+            if self.numeric_index != None and is_item:
+                if item._key not in self.numeric_index.low_stock:
+                    return False
+            elif not search.is_low_stock(item.get_detail):
                 return False
 
         if self.last_page == self.out_of_stock_index:
-            if int(item.get_detail("item_quantity") or 0) == 0:
-                pass
-            else:
+            if self.numeric_index != None and is_item:
+                if item._key not in self.numeric_index.out_of_stock:
+                    return False
+            elif not search.is_out_of_stock(item.get_detail):
                 return False
 
-        for parameter in self.filter_parameters:
-            text = parameter[0] # text to search
-            #text = text.lower()
-            detail_call = parameter[1] # detail where to search
-            item_detail = item.get_detail(detail_call) # item detail
-
-            if text == "":
-                continue
-
-            if text[0] == "!":
-                try:
-                    float(text[2:])
-                    float(item_detail)
-                except:
-                    show = False
-                    break
-                value = float(text[2:])
-                if text[1] == ">":
-                    if float(item_detail) > value:
-                        continue
-                elif text[1] == "<":
-                    if float(item_detail) < value:
-                        continue
-                else:
-                    show = False
-                    break
-
-            if item_detail == None:
-                show = False
-                break
-            if text.lower() in str(item_detail).lower():
+        # the search bar conditions are compiled by filter_rows, the text
+        # index already ruled out the items missing from search_candidates
+        if self.search_candidates != None and is_item:
+            if item._key not in self.search_candidates:
+                return False
+            if self.search_candidates_exact:
+                return True
+        return self.search_query.matches(item.get_detail)
+
+    def find_search_candidates(self, query):
+        # the indexes still being built are left out, the filter checks
+        # the items they would have ruled out
+        candidates = None
+        for name, (index_type, details) in self.index_types.items():
+            if not index_type.can_narrow(query):
                 continue
+            index = self.search_index(name)
+            if index != None:
+                keys = index.candidates(query)
+                candidates = keys if candidates == None else candidates & keys
+        return candidates
+
+    def match_search_in_background(self, incremental):
+        # searches of large inventories the indexes can't narrow are matched
+        # in a worker thread, over a copy of the columns of item_records
+        query = self.search_query
+        if query.is_empty() or query.never or isinstance(self.model, LazyItemStore):
+            return False
+        if len(self.model) < self.background_search_items:
+            return False
+
+        thread = threading.Thread(target=self.match_search_thread,
+                args=(query, item_records.snapshot(), self.search_generation, incremental), daemon=True)
+        thread.start()
+        return True
+
+    def match_search_thread(self, query, store, generation, incremental):
+        # the rows of items not in the model only add keys the filter never
+        # asks about
+        try:
+            item = records.view_class(Item, store, ["get_detail"])()
+            keys = set()
+            for row in store.live_rows():
+                item._row = row
+                if query.matches(item.get_detail):
+                    keys.add(item._key)
+        except Exception as e:
+            print(str(e))
+            keys = None
+        GLib.idle_add(self.on_search_matched, query, keys, generation, incremental)
+
+    def on_search_matched(self, query, keys, generation, incremental):
+        if query is not self.search_query:
+            # a newer search replaced this one
+            return False
+
+        # if the items changed meanwhile the filter checks every item itself
+        if keys != None and generation == self.search_generation:
+            self.search_candidates = keys
+            self.search_candidates_exact = True
+        self.refilter(incremental)
+        self.update_sidebar_item_info()
+        return False
+
+    def search_index(self, name):
+        # the index called name when it covers every item, else None. The
+        # first call starts building it in chunks from an idle callback,
+        # until it is done the filter checks the items one by one
+        if name not in self.index_builds:
+            if isinstance(self.model, LazyItemStore):
+                # indexing would build every item of the file
+                return None
+            index_type, details = self.index_types[name]
+            self.index_builds[name] = search.IndexBuild(index_type(details))
+            self.continue_index_builds()
+        return getattr(self, name)
+
+    def continue_index_builds(self):
+        n_items = self.model.get_n_items()
+        for name, build in self.index_builds.items():
+            if build.position == n_items:
+                setattr(self, name, build.index)
             else:
-                show = False
-                break
-        return show
+                setattr(self, name, None)
+                if self.index_build_source == None:
+                    self.index_build_source = GLib.idle_add(self.on_index_build_idle, priority=GLib.PRIORITY_LOW)
+
+    def on_index_build_idle(self):
+        # indexes the items for a few milliseconds at a time, so the window
+        # keeps responding, after the batches of a load
+        deadline = time.monotonic() + 0.01
+        n_items = self.model.get_n_items()
+        for build in self.index_builds.values():
+            while build.position < n_items and time.monotonic() < deadline:
+                end = min(build.position + 32, n_items)
+                items = [self.model[position] for position in range(build.position, end)]
+                build.step((item._key, item.get_detail) for item in items)
+
+        if any(build.position < n_items for build in self.index_builds.values()):
+            return True
+        self.index_build_source = None
+        self.continue_index_builds()
+        return False
+
+    def update_search_index(self, position, removed, items):
+        self.filter_cache = {}
+        self.search_generation += 1
+        if self.index_builds:
+            # item_keys still holds the keys of the removed items
+            removed_keys = self.item_keys[position:position + removed]
+            rows = [(item._key, item.get_detail) for item in items]
+            for build in self.index_builds.values():
+                build.splice(position, removed_keys, rows)
+            self.continue_index_builds()
+
+        # new and edited items matching the search have to stay visible
+        if self.search_candidates != None:
+            for item in items:
+                if self.search_query.matches(item.get_detail):
+                    self.search_candidates.add(item._key)
+                elif self.search_candidates_exact:
+                    self.search_candidates.discard(item._key)
 
     def on_window_activate(self, window):
         # Function to be executed when the window is activated
@@ -1182,262 +1572,504 @@ class InventarioWindow(Adw.ApplicationWindow):
             self.update_sidebar_item_info()
 
     def read_inventory_file(self, inventory_path):
+        self.cancel_loading()
+
+        if isinstance(self.model, LazyItemStore):
+            self.set_items_model(Gio.ListStore(item_type=Item))
         self.model.remove_all()
+        self.products_model.remove_all()
         if inventory_path == "":
             return
 
+        # The csv files are parsed and converted in a worker thread, the
+        # finished batches are handed back to the main loop with idle
+        # callbacks, each one adding its items with a single splice
+
+        cancellable = Gio.Cancellable()
+        self.load_cancellable = cancellable
+        self.load_progress_bar.set_fraction(0)
+        self.load_progress_bar.set_visible(True)
+
+        lazy = self.settings.get_boolean("lazy-loading")
+        thread = threading.Thread(target=self.read_inventory_thread,
+                args=(inventory_path, lazy, cancellable), daemon=True)
+        thread.start()
+
+    def set_items_model(self, model, aggregate_entries=[], item_ids=[]):
+        self.model.disconnect(self.items_changed_handler)
+        self.model = model
+        self.item_aggregates.reset(aggregate_entries)
+        self.item_ids = list(item_ids)
+        self.item_id_counts = collections.Counter(self.item_ids)
+        self.item_keys = []
+        self.item_positions = {}
+        unsaved_items.clear()
+        self.update_summary()
+        self.text_index = None
+        self.numeric_index = None
+        self.index_builds = {}
+        if self.index_build_source != None:
+            GLib.source_remove(self.index_build_source)
+            self.index_build_source = None
+        self.search_candidates = None
+        self.search_candidates_exact = False
+        self.search_generation += 1
+        self.filter_cache = {}
+        self.items_changed_handler = self.model.connect("items-changed", self.on_items_model_changed)
+        self.tree_model_filter.set_model(model)
+
+    def on_items_model_changed(self, model, position, removed, added):
+        items = [model[index] for index in range(position, position + added)]
+        self.item_aggregates.splice(position, removed, [self.aggregate_entry(item) for item in items])
+        self.update_summary()
+        self.update_search_index(position, removed, items)
+        self.update_item_ids(position, removed, items)
+        self.update_item_keys(position, removed, items)
+
+    def on_products_model_changed(self, model, position, removed, added):
+        self.summary.update("products-count", model.get_n_items())
+
+    def aggregate_entry(self, item):
+        # read from the columns of the record of the item, the details
+        # aggregated are all kept under "_" + detail_call
+        row = item._row
+        return aggregates.item_entry(lambda detail_call: item_records.get("_" + detail_call, row))
+
+    def update_item_aggregates(self, item):
+        position = self.item_position(item)
+        if position != None:
+            self.item_aggregates.update(position, self.aggregate_entry(item))
+            self.update_summary()
+            self.update_search_index(position, 1, [item])
+            self.update_item_ids(position, 1, [item])
+
+    def update_item_ids(self, position, removed, items):
+        for item_id in self.item_ids[position:position + removed]:
+            self.item_id_counts[item_id] -= 1
+            if self.item_id_counts[item_id] == 0:
+                del self.item_id_counts[item_id]
+        item_ids = [storage.csv_cell(item.item_id) for item in items]
+        self.item_id_counts.update(item_ids)
+        self.item_ids[position:position + removed] = item_ids
+
+    def update_item_keys(self, position, removed, items):
+        if isinstance(self.model, LazyItemStore):
+            # its items are built again, with a new key, when needed
+            return
+        keys = [item._key for item in items]
+        if removed == 0 and position == len(self.item_keys) and self.item_positions != None:
+            for offset, key in enumerate(keys):
+                self.item_positions[key] = position + offset
+        else:
+            self.item_positions = None
+        self.item_keys[position:position + removed] = keys
+
+    def item_position(self, item):
+        # the position of item in the model, None when it isn't there
+        if isinstance(self.model, LazyItemStore):
+            found, position = self.model.find(item)
+            return position if found else None
+        if self.item_positions == None:
+            self.item_positions = dict(zip(self.item_keys, range(len(self.item_keys))))
+        return self.item_positions.get(item._key)
+
+    def update_summary(self):
+        self.summary.update("items-count", self.item_aggregates.count)
+        self.summary.update("inventory-value", round(self.item_aggregates.value, 2))
+        self.summary.update("low-stock-count", self.item_aggregates.low_stock)
+        self.summary.update("out-of-stock-count", self.item_aggregates.out_of_stock)
+
+    def cancel_loading(self):
+        if self.load_cancellable != None:
+            self.load_cancellable.cancel()
+            self.load_cancellable = None
+        self.load_progress_bar.set_visible(False)
+
+    def is_loading(self):
+        return self.load_cancellable != None
+
+    def read_inventory_thread(self, inventory_path, lazy, cancellable):
         items_list_path = inventory_path + "/inventory.csv"
         preferences_path = inventory_path + "/preferences.csv"
         products_folder_path = inventory_path + "/products/"
+        database_path = inventory_path + "/" + sqlite_storage.DATABASE_NAME
 
-        parent_dir = os.path.dirname(products_folder_path)
-        os.makedirs(parent_dir, exist_ok=True)
+        backend = "sqlite" if os.path.isfile(database_path) else "csv"
 
-        products_files = [f for f in os.listdir(products_folder_path) if os.path.isfile(os.path.join(products_folder_path, f))]
+        # A csv folder that didn't change since it was last parsed is read
+        # back from the cache of the parsed tuples, otherwise the cache is
+        # rebuilt from what gets parsed now
+        cache_path = storage.inventory_cache_path(GLib.get_user_cache_dir() + "/inventario", inventory_path)
+        cache_key = None
+        cached = None
+        items = []
 
-        for file in products_files:
-            this_product_path = products_folder_path + file
+        # Lazily loaded items are read straight from inventory.csv, so the
+        # journal is folded into it first
+        lazy = lazy and backend == "csv"
 
-            try:
-                open(this_product_path, 'r').read()
-            except Exception as e:
-                self.send_toast("Error reading inventory file:" + str(e))
-                self.settings.set_string("last-inventory-path", "")
-                self.win.model.remove_all()
-                self.win.products_model.remove_all()
-                return
+        try:
+            if backend == "sqlite":
+                products = sqlite_storage.load_products(database_path, self.product_detail_types)
+            elif lazy:
+                os.makedirs(products_folder_path, exist_ok=True)
+                self.writer.flush()
+                if os.path.exists(inventory_path + "/" + storage.JOURNAL_NAME):
+                    storage.compact_journal(inventory_path)
+            else:
+                os.makedirs(products_folder_path, exist_ok=True)
+                cache_key = storage.inventory_cache_key(inventory_path, self.item_detail_types, self.product_detail_types)
+                cached = storage.load_inventory_cache(cache_path, cache_key)
+
+            if cached != None:
+                products = cached[0]
+            elif backend == "csv":
+                # the journal holds the changes saved since the csv files were written
+                journal = storage.read_journal(inventory_path)
+                product_files = storage.list_product_files(products_folder_path)
+                products = storage.parse_product_files(product_files, self.product_detail_types)
+                products = storage.replay_products(products, journal, self.product_detail_types)
+        except Exception as e:
+            GLib.idle_add(self.on_inventory_load_failed, "Error reading inventory file:" + str(e), cancellable)
+            return
+
+        if cancellable.is_cancelled():
+            return
+        GLib.idle_add(self.on_products_loaded, products, cancellable)
 
-            with open(this_product_path, 'r') as file:
-                file_content = file.read()
-                directory, file_name = os.path.split(this_product_path)
-                reader = csv.reader(file_content.splitlines())
-
-                product_detail_call_list = []
-                part_detail_call_list = []
-
-                for i, row in enumerate(reader):
-                    if i == 0:
-                        for i, value in enumerate(row):
-                            product_detail_call_list.append(value)
-                    elif i == 1:
-                        new_product = Product()
-                        for index, value in enumerate(row):
-                            if index > len(product_detail_call_list) - 1:
-                                break
-                            if value:
-                                try:
-                                    type_info = self.product_details_names[index][2]
-                                    detail_call = product_detail_call_list[index]
-                                    if type_info == "int":
-                                        new_value = int(round(float(value)))
-                                    elif type_info == "cost":
-                                        new_value = float(value)
-                                    else:
-                                        new_value = str(value)
-                                    new_product.set_detail(detail_call, new_value)
-                                    is_custom_value_row = True
-                                except:
-                                    pass
-                    elif i == 2:
-                        for i, value in enumerate(row):
-                            part_detail_call_list.append(value)
-                    else:
-                        new_part = Part()
-                        for i, value in enumerate(row):
-                            try:
-                                part_detail_call_list[i]
-                            except:
-                                break
-                            if part_detail_call_list[i] == "part_last_position":
-                                new_part.set_part_last_position(value)
-                            elif part_detail_call_list[i] == "part_type":
-                                new_part.set_part_type(value)
-                            else:
-                                try:
-                                    new_part.set_detail(part_detail_call_list[i], value)
-                                except:
-                                    pass
-                        new_product.append_part(new_part)
-            self.products_model.append(new_product)
         try:
-            open(preferences_path, 'r').read()
+            if backend == "sqlite":
+                preferences_rows = sqlite_storage.load_preferences_rows(database_path)
+            elif cached != None:
+                preferences_rows = cached[1]
+            else:
+                preferences_rows = list(storage.iter_csv_rows(preferences_path))
         except Exception as e:
-            self.send_toast("Error reading preferences file:" + str(e))
             print(str(e))
-            self.settings.set_string("last-inventory-path", "")
-            self.win.model.remove_all()
-            self.win.products_model.remove_all()
+            GLib.idle_add(self.on_inventory_load_failed, "Error reading preferences file:" + str(e), cancellable)
             return
 
-        with open(preferences_path, 'r') as file:
-            file_content = file.read()
-            directory, file_name = os.path.split(preferences_path)
-            reader = csv.reader(file_content.splitlines())
-            is_custom_value_row = False
-
-            custom_info_start_index = 0
-
-            item_detail_call_list = []
-
-            for i, row in enumerate(reader):
-                if i == 0:
-                    for i, value in enumerate(row):
-                        if value == "False":
-                            try:
-                                self.cv.get_columns()[i]
-                            except:
-                                pass
-                            else:
-                                self.cv.get_columns()[i].set_visible(False)
-                                self.column_visibility_check_buttons[i].set_active(False)
-                if i == 1:
-                    for i, value in enumerate(row):
-                        if value == "False":
-                            try:
-                                self.products_cv.get_columns()[i]
-                            except:
-                                pass
-                            else:
-                                self.products_cv.get_columns()[i].set_visible(False)
-                                self.products_column_visibility_check_buttons[i].set_active(False)
+        GLib.idle_add(self.on_preferences_loaded, preferences_rows, cancellable)
+
+        if lazy:
+            try:
+                row_index = storage.CsvRowIndex(items_list_path)
+
+                # the dashboard columns and the ids are filled from the rows
+                # here, without building the items
+                aggregate_entries = []
+                item_ids = []
+                for index in range(1, len(row_index)):
+                    if cancellable.is_cancelled():
+                        return
+                    details = dict(storage.parse_item_row(row_index.header, row_index.row(index), self.item_detail_types)[0])
+                    aggregate_entries.append(aggregates.item_entry(details.get))
+                    item_ids.append(storage.csv_cell(details.get("item_id")))
+            except Exception as e:
+                GLib.idle_add(self.on_inventory_load_failed, "Error reading inventory file:" + str(e), cancellable)
+                return
+            GLib.idle_add(self.on_items_index_loaded, row_index, aggregate_entries, item_ids, cancellable)
+            GLib.idle_add(self.on_inventory_loaded, inventory_path, backend, cancellable)
+            return
 
         try:
-            open(items_list_path, 'r').read()
+            if backend == "sqlite":
+                batches = sqlite_storage.iter_item_batches(database_path, self.item_detail_types, self.load_chunk_size)
+            elif cached != None:
+                batches = storage.iter_cached_batches(cached[2], self.load_chunk_size)
+            else:
+                batches = storage.iter_item_batches(items_list_path, self.item_detail_types, self.load_chunk_size)
+                batches = storage.replay_item_batches(batches, journal, self.item_detail_types)
+            for batch, fraction in batches:
+                if cancellable.is_cancelled():
+                    return
+                if cache_key != None and cached == None:
+                    items.extend(batch)
+                GLib.idle_add(self.on_items_batch_loaded, batch, fraction, cancellable)
         except Exception as e:
-            self.send_toast("Error reading inventory file:" + str(e))
-            self.settings.set_string("last-inventory-path", "")
-            self.win.model.remove_all()
-            self.win.products_model.remove_all()
+            GLib.idle_add(self.on_inventory_load_failed, "Error reading inventory file:" + str(e), cancellable)
             return
 
-        with open(items_list_path, 'r') as file:
-            file_content = file.read()
-            directory, file_name = os.path.split(items_list_path)
-            reader = csv.reader(file_content.splitlines())
-            is_custom_value_row = False
+        if cache_key != None and cached == None:
+            try:
+                storage.save_inventory_cache(cache_path, cache_key, products, preferences_rows, items)
+            except Exception as e:
+                print("Error writing the inventory cache: " + str(e))
+
+        GLib.idle_add(self.on_inventory_loaded, inventory_path, backend, cancellable)
+
+    def on_products_loaded(self, products, cancellable):
+        if cancellable.is_cancelled():
+            return False
+        new_products = [self.new_product_from_details(details, parts) for details, parts in products]
+        self.products_model.splice(0, 0, new_products)
+        return False
+
+    def on_preferences_loaded(self, preferences_rows, cancellable):
+        if cancellable.is_cancelled():
+            return False
+        for i, row in enumerate(preferences_rows[:2]):
+            if i == 0:
+                columns = self.cv.get_columns()
+                check_buttons = self.column_visibility_check_buttons
+            else:
+                columns = self.products_cv.get_columns()
+                check_buttons = self.products_column_visibility_check_buttons
+            for index, value in enumerate(row):
+                if value == "False" and index < len(columns):
+                    columns[index].set_visible(False)
+                    check_buttons[index].set_active(False)
+        return False
+
+    def on_items_batch_loaded(self, batch, fraction, cancellable):
+        if cancellable.is_cancelled():
+            return False
+        new_items = [self.new_item_from_details(details, custom_values) for details, custom_values in batch]
+        if new_items:
+            self.model.splice(self.model.get_n_items(), 0, new_items)
+        self.load_progress_bar.set_fraction(fraction)
+        return False
+
+    def on_items_index_loaded(self, row_index, aggregate_entries, item_ids, cancellable):
+        if cancellable.is_cancelled():
+            return False
+        header = row_index.header
+
+        def materialize(row):
+            return self.new_item_from_details(*storage.parse_item_row(header, row, self.item_detail_types))
+
+        self.set_items_model(LazyItemStore(Item, row_index, materialize), aggregate_entries, item_ids)
+        self.load_progress_bar.set_fraction(1)
+        return False
+
+    def on_inventory_loaded(self, inventory_path, backend, cancellable):
+        if cancellable.is_cancelled():
+            return False
+        self.load_cancellable = None
+        self.load_progress_bar.set_visible(False)
+        self.mark_inventory_saved(inventory_path, backend)
 
-            custom_info_start_index = 0
+        self.settings.set_string("last-inventory-path", inventory_path)
+        self.title_label.set_label(os.path.basename(os.path.normpath(inventory_path)))
+        self.subtitle_label.set_visible(True)
+        self.subtitle_label.set_label("~" + inventory_path)
+        self.send_toast("File successfully opened")
+        return False
+
+    def on_inventory_load_failed(self, message, cancellable):
+        if cancellable.is_cancelled():
+            return False
+        self.load_cancellable = None
+        self.load_progress_bar.set_visible(False)
+        self.mark_inventory_saved("")
+
+        self.send_toast(message)
+        self.settings.set_string("last-inventory-path", "")
+        self.model.remove_all()
+        self.products_model.remove_all()
+        return False
+
+    def new_item_from_details(self, details, custom_values):
+        new_item = Item(self.details_lenght)
+        for detail_call, value in details:
+            try:
+                new_item.set_detail(detail_call, value)
+            except ValueError:
+                pass
+        for name, value in custom_values:
+            new_item.append_custom_value(name, value)
+        new_item.set_dirty(False)
+        return new_item
 
-            item_detail_call_list = []
+    def new_product_from_details(self, details, parts):
+        new_product = Product()
+        for detail_call, value in details:
+            try:
+                new_product.set_detail(detail_call, value)
+            except ValueError:
+                pass
 
-            for i, row in enumerate(reader):
-                if i == 0:
-                    for i, value in enumerate(row):
-                        item_detail_call_list.append(value)
+        for part_details in parts:
+            new_part = Part()
+            for detail_call, value in part_details:
+                if detail_call == "part_last_position":
+                    new_part.set_part_last_position(value)
+                elif detail_call == "part_type":
+                    new_part.set_part_type(value)
                 else:
-                    new_item = Item(0)
-                    for index, value in enumerate(row):
-                        if index > len(item_detail_call_list) - 1:
-                            custom_info_start_index = index
-                            break
-                        if value:
-                            try:
-                                type_info = self.details_names[index][2]
-                                detail_call = item_detail_call_list[index] # self.details_names[index][1]
-                                if type_info == "int":
-                                    new_value = int(round(float(value)))
-                                elif type_info == "cost":
-                                    new_value = float(value)
-                                else:
-                                    new_value = str(value)
-                                new_item.set_detail(detail_call, new_value)
-                                is_custom_value_row = True
-                            except:
-                                pass
-                    if custom_info_start_index > 0:
-                        for index in range(int((len(row) - custom_info_start_index)/2)):
-                            new_item.append_custom_value(row[custom_info_start_index + index],row[custom_info_start_index + index + 1])
-
-                    self.model.append(new_item)
-
-            self.settings.set_string("last-inventory-path", inventory_path)
-            self.title_label.set_label(os.path.basename(os.path.normpath(inventory_path)))
-            self.subtitle_label.set_visible(True)
-            self.subtitle_label.set_label("~" + inventory_path)
-            self.send_toast("File successfully opened")
+                    try:
+                        new_part.set_detail(detail_call, value)
+                    except ValueError:
+                        pass
+            new_product.append_part(new_part)
+        new_product.set_dirty(False)
+        return new_product
 
     def save_inventory_file(self, inventory_path):
-        items_list_path = inventory_path + "/inventory.csv"
-        products_path = inventory_path + "/products/"
-        preferences_path = inventory_path + "/preferences.csv"
-
-        parent_dir = os.path.dirname(products_path)
-        os.makedirs(parent_dir, exist_ok=True)
+        if self.is_loading():
+            # saving now would overwrite the files with a partial inventory
+            self.send_toast("The inventory is still loading")
+            return
 
         if inventory_path == "":
             self.save_inventory_file_as()
             return
-        try:
-            open(items_list_path, 'w', newline='\n')
-        except Exception as e:
-            self.send_toast(str(e))
-            print(str(e))
-        else:
-            with open(items_list_path, 'w', newline='\n') as csvfile:
-                writer = csv.writer(csvfile)
-
-                column_view_row = [detail_name[1] for detail_name in self.details_names]
-                writer.writerow(column_view_row)
-
-                for item in self.model:
-                    item_row = [item.get_detail(self.details_names[index][1]) for index in range(len(self.details_names))]
-                    for custom_value in item.custom_values_list():
-                        item_row.append(custom_value[0])
-                        item_row.append(custom_value[1])
-                    writer.writerow(item_row)
-
-        try:
-            open(preferences_path, 'w', newline='\n')
-        except Exception as e:
-            self.send_toast(str(e))
-            print(str(e))
-        else:
-            with open(preferences_path, 'w', newline='\n') as csvfile:
-                writer = csv.writer(csvfile)
-
-                column_view_row = [self.cv.get_columns()[index].get_visible() for index in range(len(self.details_names))]
-                writer.writerow(column_view_row)
-
-                products_column_view_row = [self.products_cv.get_columns()[index].get_visible() for index in range(len(self.product_details_names))]
-                writer.writerow(products_column_view_row)
 
+        # The rows are snapshotted here, the encoding and the writes happen
+        # in the writer thread. Only the items and products that changed
+        # since the last load/save of this same folder are written, to the
+        # database or to the journal of a csv folder, saving to another
+        # folder or in another format writes everything. inventory.csv is
+        # always written whole, by such a full save or when the journal is
+        # compacted, never for a single changed item
+        backend = self.backend_for_path(inventory_path)
+        full_save = inventory_path != self.saved_inventory_path or backend != self.inventory_backend
+
+        snapshot = storage.InventorySnapshot(inventory_path, backend)
+        snapshot.full = full_save
+        snapshot.item_columns = [detail_name[1] for detail_name in self.details_names]
+        changed_items = {}
+        if self.items_dirty and not full_save:
+            for item in self.dirty_items():
+                changed_items.setdefault(storage.csv_cell(item.item_id), []).append(item)
+        if full_save or (self.items_dirty and not self.can_save_item_changes(changed_items)):
+            snapshot.items_rows = list(self.items_rows())
+            for item in self.dirty_items():
+                item.set_dirty(False)
+        elif self.items_dirty:
+            for item_id, items in changed_items.items():
+                snapshot.changed_items[item_id] = self.item_row(items[0])
+                items[0].set_dirty(False)
+            snapshot.removed_item_ids = set(self.deleted_item_ids)
+        if full_save or self.preferences_dirty:
+            snapshot.preferences_rows = list(self.preferences_rows())
+
+        product_ids = set()
         for product in self.products_model:
-            this_product_path = products_path + str(product.product_id) + ".csv"
-            try:
-                open(this_product_path, 'w', newline='\n')
-            except Exception as e:
-                self.send_toast(str(e))
-                print(str(e))
-            else:
-                with open(this_product_path, 'w', newline='\n') as csvfile:
-                    writer = csv.writer(csvfile)
-
-                    column_view_row = [product_detail_name[1] for product_detail_name in self.product_details_names]
-                    writer.writerow(column_view_row)
+            product_id = str(product.product_id)
+            product_ids.add(product_id)
+            if full_save or product.is_dirty():
+                snapshot.products[product_id] = list(self.product_rows(product))
+                product.set_dirty(False)
+        if not full_save:
+            snapshot.removed_product_ids = set(self.deleted_product_ids) - product_ids
 
-                    product_row = [product.get_detail(self.product_details_names[index][1]) for index in range(len(self.product_details_names))]
-                    writer.writerow(product_row)
-
-                    parts_column_view_row = [part_detail[1] for part_detail in self.part_detail_calls]
-                    parts_column_view_row.append("part_last_position")
-                    parts_column_view_row.append("part_type")
-                    writer.writerow(parts_column_view_row)
-
-                    for part in product.product_parts_list:
-                        part_row = [part.get_detail(part_detail[1]) for part_detail in self.part_detail_calls]
-                        part_row.append(part.part_last_position())
-                        part_row.append(part.part_type())
-                        writer.writerow(part_row)
+        self.mark_inventory_saved(inventory_path, backend)
+        self.writer.submit(snapshot)
 
         directory, file_name = os.path.split(inventory_path)
         self.subtitle_label.set_visible(True)
         self.subtitle_label.set_label("~" + directory)
         self.title_label.set_label(file_name)
 
-        self.send_toast("File saved")
+        self.settings.set_string("last-inventory-path", inventory_path)
+
+    def can_save_item_changes(self, changed_items):
+        # The saved changes are matched to the stored items by id, so an
+        # item can only be saved alone when no other item has its id, and
+        # a removed id only when no item has it anymore. Otherwise all the
+        # items are written
+        for item_id, items in changed_items.items():
+            if item_id == "" or len(items) > 1 or self.item_id_counts[item_id] != 1:
+                return False
+        for item_id in self.deleted_item_ids:
+            if item_id == "" or self.item_id_counts[item_id] != 0:
+                return False
+        return True
+
+    def backend_for_path(self, inventory_path):
+        if inventory_path == self.saved_inventory_path:
+            return self.inventory_backend
+        if os.path.isfile(inventory_path + "/" + sqlite_storage.DATABASE_NAME):
+            return "sqlite"
+        if os.path.isfile(inventory_path + "/inventory.csv"):
+            return "csv"
+        return self.settings.get_string("storage-backend")
+
+    def on_snapshot_written(self, snapshot, error):
+        # called from the writer thread
+        GLib.idle_add(self.on_inventory_saved, snapshot.inventory_path, error)
+
+    def on_inventory_saved(self, inventory_path, error):
+        if error != None:
+            self.send_toast(str(error))
+            print(str(error))
+            # the flags were cleared when the snapshot was taken, so the next
+            # save of this folder has to write everything again
+            if self.saved_inventory_path == inventory_path:
+                self.saved_inventory_path = ""
+            return False
 
+        self.send_toast("File saved")
         print("files saved in " + str(inventory_path))
-        self.settings.set_string("last-inventory-path", inventory_path)
+        return False
+
+    def items_rows(self):
+        header = [detail_name[1] for detail_name in self.details_names]
+        yield header
+
+        if isinstance(self.model, LazyItemStore):
+            yield from self.model.iter_rows(header, self.item_row)
+            return
+        for item in self.model:
+            yield self.item_row(item)
+
+    def dirty_items(self):
+        if isinstance(self.model, LazyItemStore):
+            return self.model.dirty_items()
+        items = []
+        for key, item in list(unsaved_items.items()):
+            if self.item_position(item) == None:
+                # deleted, or never added to the inventory
+                del unsaved_items[key]
+            else:
+                items.append(item)
+        return items
+
+    def item_row(self, item):
+        item_row = [item.get_detail(self.details_names[index][1]) for index in range(len(self.details_names))]
+        for custom_value in item.custom_values_list():
+            item_row.append(custom_value[0])
+            item_row.append(custom_value[1])
+        return item_row
+
+    def preferences_rows(self):
+        yield [self.cv.get_columns()[index].get_visible() for index in range(len(self.details_names))]
+        yield [self.products_cv.get_columns()[index].get_visible() for index in range(len(self.product_details_names))]
+
+    def product_rows(self, product):
+        yield [product_detail_name[1] for product_detail_name in self.product_details_names]
+        yield [product.get_detail(self.product_details_names[index][1]) for index in range(len(self.product_details_names))]
+
+        parts_column_view_row = [part_detail[1] for part_detail in self.part_detail_calls]
+        parts_column_view_row.append("part_last_position")
+        parts_column_view_row.append("part_type")
+        yield parts_column_view_row
+
+        for part in product.product_parts_list:
+            part_row = [part.get_detail(part_detail[1]) for part_detail in self.part_detail_calls]
+            part_row.append(part.part_last_position())
+            part_row.append(part.part_type())
+            yield part_row
+
+    def has_unsaved_changes(self, inventory_path):
+        if inventory_path != self.saved_inventory_path:
+            return True
+        if self.items_dirty or self.preferences_dirty or self.deleted_product_ids:
+            return True
+        for product in self.products_model:
+            if product.is_dirty():
+                return True
+        return False
+
+    def mark_inventory_saved(self, inventory_path, backend="csv"):
+        self.current_inventory_path = inventory_path
+        self.saved_inventory_path = inventory_path
+        self.inventory_backend = backend
+        self.items_dirty = False
+        self.preferences_dirty = False
+        self.deleted_item_ids = []
+        self.deleted_product_ids = []
 
     def on_save_file_path_selected(self, dialog, response, dialog_parent):
         path = dialog_parent.get_file().get_path()
@@ -1558,6 +2190,7 @@ class InventarioWindow(Adw.ApplicationWindow):
             dialog.destroy()
 
         if response == "delete":
+            self.deleted_product_ids.append(str(self.products_model[product_index].product_id))
             self.products_model.remove(product_index)
 
             if self.selected_product != 0:
@@ -1587,7 +2220,9 @@ class InventarioWindow(Adw.ApplicationWindow):
             dialog.destroy()
 
         if response == "delete":
+            self.deleted_item_ids.append(storage.csv_cell(self.model[item_index].item_id))
             self.model.remove(item_index)
+            self.items_dirty = True
 
             if self.selected_item != 0:
                 self.selected_item -= 1
@@ -1605,6 +2240,7 @@ class InventarioWindow(Adw.ApplicationWindow):
 
     def on_check_button_toggled(self, check, column):
         column.set_visible(check.get_active())
+        self.preferences_dirty = True
 
     def on_file_selected(self, dialog, response):
         if response == Gtk.ResponseType.ACCEPT:
@@ -2244,6 +2880,7 @@ class InventarioWindow(Adw.ApplicationWindow):
 
     def edit_existing_item(self, btn, list_box, item, window):
         # print("edit_existing_item")
+        old_item_id = storage.csv_cell(item.item_id)
         for i in range(len(self.details_names)):
             value_widget_row = list_box.get_row_at_index(i)
 
@@ -2272,6 +2909,11 @@ class InventarioWindow(Adw.ApplicationWindow):
                         value = None
 
                     item.set_detail(detail_call, value)
+        self.update_item_aggregates(item)
+        if storage.csv_cell(item.item_id) != old_item_id:
+            # saved changes are matched to the stored items by id
+            self.deleted_item_ids.append(old_item_id)
+        self.items_dirty = True
         self.update_sidebar_item_info()
         self.send_toast(_("Item successfully edited"))
 
@@ -2301,58 +2943,76 @@ class InventarioWindow(Adw.ApplicationWindow):
     def model_func(self, args):
         pass
 
-    def add_column(self, column_name, detail_call, detail_type, column_view):
-        factory = Gtk.SignalListItemFactory()
-        factory.connect("setup", self._on_factory_setup)
-        factory.connect("bind", self._on_factory_bind, detail_call)
-        factory.connect("unbind", self._on_factory_unbind, detail_call)
-        factory.connect("teardown", self._on_factory_teardown)
-
-        print(f"{column_name} {detail_type}")
+    def add_column(self, column_name, detail_call, detail_type, column_view, item_type=Item):
+        if self.builder_factory_column(item_type, detail_call, detail_type):
+            factory = self.new_builder_factory(item_type, detail_call)
+        else:
+            factory = Gtk.SignalListItemFactory()
+            factory.connect("setup", self._on_factory_setup)
+            factory.connect("bind", self._on_factory_bind, detail_call)
+            factory.connect("unbind", self._on_factory_unbind, detail_call)
+            factory.connect("teardown", self._on_factory_teardown)
 
         col = Gtk.ColumnViewColumn(title=column_name, factory=factory, resizable=True)
-        sorter = Gtk.CustomSorter.new(self.sort_func, user_data=[detail_call, detail_type])
+        sorter = self.column_sorter(item_type, detail_call, detail_type)
         #sorter.connect("changed", self.scroll_to_the_top)
         col.set_sorter(sorter)
         col.props.expand = True
         column_view.append_column(col)
 
+    def builder_factory_column(self, item_type, detail_call, detail_type):
+        # text shown as it is stored can be bound by GTK, without python
+        # callbacks while scrolling
+        if not self.settings.get_boolean("builder-list-factories"):
+            return False
+        if detail_type not in ["str", "STR", "date", "DATE"]:
+            return False
+        return self.property_type(item_type, detail_call) == GObject.TYPE_STRING
+
+    def new_builder_factory(self, item_type, detail_call):
+        # the columns get a Gtk.ColumnViewCell since GTK 4.12
+        cell_class = "GtkColumnViewCell" if hasattr(Gtk, "ColumnViewCell") else "GtkListItem"
+        ui = self.builder_factory_ui.format(cell_class=cell_class,
+                type_name=item_type.__gtype_name__, property_name=detail_call)
+        return Gtk.BuilderListItemFactory.new_from_bytes(None, GLib.Bytes.new(ui.encode()))
+
     def scroll_to_the_top(self, change, data):
         self.content_scrolled_window.get_vadjustment().set_value(0)
 
-    def sort_func(self, obj_1, obj_2, detail_call_and_type):
-        detail_call = detail_call_and_type[0]
-        detail_type = detail_call_and_type[1]
-        obj_1_detail = obj_1.get_detail(detail_call)
-        obj_2_detail = obj_2.get_detail(detail_call)
-
-        if detail_type in ["int", "cost", "value"]:
-            if detail_type == "value":
-                obj_1_detail, unit = self.split_string_with_unit(obj_1_detail)
-                obj_2_detail, unit = self.split_string_with_unit(obj_2_detail)
-            if obj_1_detail == None:
-                obj_1_detail = 0
-            if obj_2_detail == None:
-                obj_2_detail = 0
-            if float(obj_1_detail) < float(obj_2_detail):
-                return -1
-            elif float(obj_1_detail) == float(obj_2_detail):
-                return 0
-            return 1
+    def property_type(self, item_type, detail_call):
+        # the GType of the property named detail_call, None if there is none
+        prop = getattr(item_type, detail_call, None)
+        if isinstance(prop, GObject.Property):
+            return prop.type
+        return None
+
+    def column_sorter(self, item_type, detail_call, detail_type):
+        # GTK sorts by numbers and strings itself, taking the key of every
+        # row once, only values with a unit are compared in python, by
+        # base unit and magnitude
+        if detail_type in ["int", "INT", "cost"]:
+            if self.property_type(item_type, detail_call) in [GObject.TYPE_INT, GObject.TYPE_DOUBLE]:
+                expression = Gtk.PropertyExpression.new(item_type, None, detail_call)
+            else:
+                # numbers kept as text, like the costs
+                expression = Gtk.ClosureExpression.new(GObject.TYPE_DOUBLE,
+                        lambda obj: sorting.sort_key(obj, detail_call, detail_type), None)
+            return Gtk.NumericSorter.new(expression)
+
+        if detail_type != "value" and detail_type != "progress":
+            if self.property_type(item_type, detail_call) == GObject.TYPE_STRING:
+                expression = Gtk.PropertyExpression.new(item_type, None, detail_call)
+            else:
+                expression = Gtk.ClosureExpression.new(GObject.TYPE_STRING,
+                        lambda obj: sorting.string_value(obj.get_detail(detail_call)), None)
+            sorter = Gtk.StringSorter.new(expression)
+            sorter.set_ignore_case(True)
+            return sorter
 
-        else:
-            print(str(obj_1_detail).lower())
-            if obj_1_detail == None and obj_2_detail == None:
-                return 1
-            elif obj_1_detail == None:
-                return 0
-            elif obj_2_detail == None:
-                return -1
-            elif str(obj_1_detail).lower() < str(obj_2_detail).lower():
-                return -1
-            elif str(obj_1_detail).lower() == str(obj_2_detail).lower():
-                return 0
-            return 1
+        return Gtk.CustomSorter.new(self.sort_func, user_data=[detail_call, detail_type])
+
+    def sort_func(self, obj_1, obj_2, detail_call_and_type):
+        return sorting.compare(obj_1, obj_2, detail_call_and_type[0], detail_call_and_type[1])
 
     def show_items(self):
         # print("show items")
@@ -2371,7 +3031,7 @@ class InventarioWindow(Adw.ApplicationWindow):
 
         if self.selected_item != None:
             self.cv.get_model().select_item(self.selected_item, True)
-        self.row_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.refilter()
         self.selected_item = self.selection_model.get_selection().get_maximum()
         self.update_sidebar_item_info()
 
@@ -2391,28 +3051,40 @@ class InventarioWindow(Adw.ApplicationWindow):
         # cell._binding = None
         # list_item.set_child(cell)
 
+    def cell_formatter(self, what):
+        # the function turning a detail into the text of its cells, made
+        # once per column
+        formatter = self.cell_formatters.get(what)
+        if formatter == None:
+            if what == "item_cost":
+                formatter = lambda detail: str(detail) + " €"
+            else:
+                formatter = str
+            self.cell_formatters[what] = formatter
+        return formatter
+
+    def category_css_class(self, detail):
+        for category, css_class in self.category_css_classes:
+            if detail in category:
+                return css_class
+        return None
+
+    def on_coloured_categories_changed(self, settings, key):
+        self.coloured_categories = settings.get_boolean(key)
+
     def _on_factory_bind(self, factory, list_item, what):
         label = list_item.get_child()
         item = list_item.get_item().get_item()
         if what != None:
             detail = item.get_detail(what)
             if detail != None:
-                if what == "item_cost":
-                    detail = str(detail) + " €"
-                elif "category" in what and self.settings.get_boolean("enable-coloured-categories"):
-                    if detail in "ELECTRONICS":
-                        # label.add_css_class("accent")
-                        # label.add_css_class("title-3")
-                        label.add_css_class("electronics")
-                    elif detail in "MECHANICAL":
-                        # label.add_css_class("success")
-                        # label.add_css_class("title-3")
-                        label.add_css_class("mechanical")
-                    elif detail in "CONSUMABLE":
-                        # label.add_css_class("warning")
-                        # label.add_css_class("title-3")
-                        label.add_css_class("consumable")
-                label.set_label(str(detail))
+                if self.coloured_categories and "category" in what:
+                    css_class = self.category_css_class(detail)
+                    if css_class != None:
+                        # removed again by _on_factory_unbind
+                        label.add_css_class(css_class)
+                        label._css_class = css_class
+                label.set_label(self.cell_formatter(what)(detail))
         else:
             label.set_label("")
         # cell = list_item.get_child()
@@ -2431,6 +3103,11 @@ class InventarioWindow(Adw.ApplicationWindow):
         #     cell._binding = None
         label = list_item.get_child()
         label.set_text("")
+        # recycled labels must not keep the colour of another category
+        css_class = getattr(label, "_css_class", None)
+        if css_class != None:
+            label.remove_css_class(css_class)
+            label._css_class = None
 
     def _on_factory_teardown(self, factory, list_item):
         cell = list_item.get_child()
@@ -2786,6 +3463,7 @@ class InventarioWindow(Adw.ApplicationWindow):
         # name = list_box.get_row_at_index(index).get_child().get_first_child().get_text()
 
         self.model.append(new_item)
+        self.items_dirty = True
         self.selected_item = len(self.model) - 1
         self.update_sidebar_item_info()
         window.destroy()
@@ -3057,7 +3735,8 @@ class InventarioWindow(Adw.ApplicationWindow):
         if self.selected_item != None:
             self.cv.get_model().select_item(self.selected_item, True)
 
-        self.row_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.search_index("numeric_index")
+        self.refilter()
         self.selected_item = self.selection_model.get_selection().get_maximum()
         self.update_sidebar_item_info()
 
@@ -3078,7 +3757,8 @@ class InventarioWindow(Adw.ApplicationWindow):
 
         if self.selected_item != None:
             self.cv.get_model().select_item(self.selected_item, True)
-        self.row_filter.changed(Gtk.FilterChange.DIFFERENT)
+        self.search_index("numeric_index")
+        self.refilter()
         self.selected_item = self.selection_model.get_selection().get_maximum()
         self.update_sidebar_item_info()
 
@@ -3093,9 +3773,10 @@ class InventarioWindow(Adw.ApplicationWindow):
         self.action_bar_revealer.set_transition_duration(0)
         self.action_bar_revealer.set_reveal_child(False)
         self.action_bar_revealer.set_transition_duration(250)
-        self.dashboard_box = Gtk.FlowBox(margin_start=10, margin_top=10, margin_bottom=10, hexpand=True,
-                margin_end=10, valign=Gtk.Align.START, selection_mode=Gtk.SelectionMode.NONE,
-                max_children_per_line=4, homogeneous=True)
+        # The dashboard is built once, its tiles are bound to the summary
+        # and follow the inventory on their own
+        if self.dashboard_box == None:
+            self.build_dashboard()
         self.content_scrolled_window.set_child(self.dashboard_box)
 
         info_page_status_page = Adw.StatusPage(title="Work in progress",
@@ -3104,22 +3785,39 @@ class InventarioWindow(Adw.ApplicationWindow):
 
         self.info_panel.set_child(info_page_status_page)
 
-        items_widget = self.dashboard_simple_widget("Items", len(self.model))
+        for list_box, group in self.dashboard_list_boxes:
+            self.fill_dashboard_list(list_box, self.item_aggregates.value_by(group))
+
+    def build_dashboard(self):
+        self.dashboard_box = Gtk.FlowBox(margin_start=10, margin_top=10, margin_bottom=10, hexpand=True,
+                margin_end=10, valign=Gtk.Align.START, selection_mode=Gtk.SelectionMode.NONE,
+                max_children_per_line=4, homogeneous=True)
+
+        def format_value(value):
+            return str(round(value, 2)) + " " + self.settings.get_string("currency")
+
+        items_widget = self.dashboard_summary_widget("Items", "items-count")
         items_widget.connect("clicked", self.on_go_items_button_clicked)
         self.dashboard_box.append(items_widget)
 
-        low_stock_widget = self.dashboard_simple_widget("Low Stock", self.get_low_stock())
+        low_stock_widget = self.dashboard_summary_widget("Low Stock", "low-stock-count")
         low_stock_widget.connect("clicked", self.on_go_to_low_stock_button_clicked)
         self.dashboard_box.append(low_stock_widget)
 
-        out_of_stock_widget = self.dashboard_simple_widget("Out of Stock", self.get_out_of_stock())
+        out_of_stock_widget = self.dashboard_summary_widget("Out of Stock", "out-of-stock-count")
         out_of_stock_widget.connect("clicked", self.on_go_to_out_of_stock_button_clicked)
         self.dashboard_box.append(out_of_stock_widget)
 
-        self.dashboard_box.append(self.dashboard_simple_widget("Items Value", str(self.get_items_inventory_value()) + " " + self.settings.get_string("currency")))
+        self.dashboard_box.append(self.dashboard_summary_widget("Items Value", "inventory-value", format_value))
+
+        self.dashboard_list_boxes = []
+        for info_name, group in [("Value by Category", "category"), ("Value by Storage", "storage"), ("Value by Seller", "seller")]:
+            list_box = self.dashboard_list_widget(info_name)
+            self.dashboard_list_boxes.append((list_box, group))
+            self.dashboard_box.append(list_box)
         # self.dashboard_box.append(self.dashboard_progress_widget("Items to 100", len(self.model), 100))
 
-        items_widget = self.dashboard_simple_widget("Products", len(self.products_model))
+        items_widget = self.dashboard_summary_widget("Products", "products-count")
         items_widget.connect("clicked", self.on_go_products_button_clicked)
         self.dashboard_box.append(items_widget)
 
@@ -3150,35 +3848,13 @@ class InventarioWindow(Adw.ApplicationWindow):
         self.navigation_select_page(self.products_index)
 
     def get_items_inventory_value(self):
-        total = 0
-        for i in range(len(self.model)):
-            cost = self.model[i].item_cost
-            stock = self.model[i].item_quantity
-            if cost != None and stock != None:
-                total += float(cost) * int(stock)
-        return total
+        return self.summary.inventory_value
 
     def get_out_of_stock(self):
-        out_of_stock_items_n = 0
-        for item in self.model:
-            stock = item.item_quantity
-            if stock == None:
-                out_of_stock_items_n += 1
-                continue
-            if stock == 0:
-                out_of_stock_items_n += 1
-        return out_of_stock_items_n
+        return self.summary.out_of_stock_count
 
     def get_low_stock(self):
-        low_stock_items_n = 0
-        for item in self.model:
-            stock = item.item_quantity
-            threshold = item.item_low_stock
-            if stock == None or threshold == None:
-                continue
-            if stock <= threshold:
-                low_stock_items_n += 1
-        return low_stock_items_n
+        return self.summary.low_stock_count
 
     def add_dashboard_widget(self, name, x, y, width, height):
         pass
@@ -3207,6 +3883,38 @@ class InventarioWindow(Adw.ApplicationWindow):
         box2.append(Gtk.Label(label=info, hexpand=True, margin_end=10, vexpand=True))
         return button
         
+    def dashboard_summary_widget(self, info_name, property_name, format_value=str):
+        # format_value is called again whenever the property is notified
+        button = self.dashboard_simple_widget(info_name, "")
+        label = button.get_child().get_last_child().get_last_child()
+        self.summary.bind_property(property_name, label, "label", GObject.BindingFlags.SYNC_CREATE,
+                lambda binding, value: format_value(value))
+        return button
+
+    def on_currency_changed(self, settings, key):
+        # the tiles showing a value reformat it with the new currency
+        self.summary.notify("inventory-value")
+        if self.dashboard_box != None:
+            for list_box, group in self.dashboard_list_boxes:
+                self.fill_dashboard_list(list_box, self.item_aggregates.value_by(group))
+
+    def dashboard_list_widget(self, info_name):
+        box = Gtk.Box(css_classes=["card"], margin_start=6, margin_end=6,
+                margin_top=6, margin_bottom=6, hexpand=True, spacing = 6, orientation=1, height_request=100)
+        box.append(Gtk.Label(css_classes=["title-4"], label=info_name, hexpand=True, xalign=0, margin_start=10, margin_top=10))
+        return box
+
+    def fill_dashboard_list(self, box, values, max_rows=5):
+        while box.get_first_child() != box.get_last_child():
+            box.remove(box.get_last_child())
+
+        currency = self.settings.get_string("currency")
+        for name, value in values[:max_rows]:
+            row = Gtk.Box(margin_start=10, margin_end=10)
+            row.append(Gtk.Label(label=name or "-", hexpand=True, xalign=0, ellipsize=3))
+            row.append(Gtk.Label(label=str(round(value, 2)) + " " + currency, xalign=1))
+            box.append(row)
+
     def dashboard_progress_widget(self, info_name, info, total):
         box = Gtk.Box(css_classes=["card"], margin_start=6, margin_end=6,
                 margin_top=6, margin_bottom=6, hexpand=True, spacing = 6, orientation=1, height_request=100)
@@ -3509,7 +4217,12 @@ class InventarioWindow(Adw.ApplicationWindow):
         if not self.settings.get_boolean("automatic-save"):
             return 0
 
-        path = self.settings.get_string("last-inventory-path")
+        if self.is_loading():
+            return 1
+
+        path = self.current_inventory_path
+        if path == "" or not self.has_unsaved_changes(path):
+            return 1
         self.save_inventory_file(path)
         return 1
 
@@ -0,0 +1,96 @@
+# test_journal.py
+#
+# Copyright 2023 Nokse
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+
+# usage: python3 -m unittest discover tests
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import storage
+
+ITEM_COLUMNS = ["item_id", "item_name"]
+
+def save_item(inventory_path, item_id, name):
+    snapshot = storage.InventorySnapshot(inventory_path)
+    snapshot.item_columns = ITEM_COLUMNS
+    snapshot.changed_items = {item_id: [item_id, name]}
+    storage.append_journal(inventory_path + "/" + storage.JOURNAL_NAME, snapshot)
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.inventory_path = self.directory.name
+        self.journal_path = self.inventory_path + "/" + storage.JOURNAL_NAME
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_saves_after_a_torn_write_are_kept(self):
+        save_item(self.inventory_path, "A", "first")
+        # a save cut short in the middle of a record
+        with open(self.journal_path, 'a') as file:
+            file.write('{"op":"item","id":"B","row":["B","tor')
+        save_item(self.inventory_path, "B", "second")
+        save_item(self.inventory_path, "C", "third")
+
+        journal = storage.read_journal(self.inventory_path)
+        self.assertEqual(journal.items, {"A": ["A", "first"], "B": ["B", "second"], "C": ["C", "third"]})
+
+    def test_uncommitted_records_are_not_applied(self):
+        save_item(self.inventory_path, "A", "first")
+        # complete records of a save that never reached its commit
+        with open(self.journal_path, 'a') as file:
+            file.write('{"op":"remove_item","id":"A"}\n')
+        self.assertEqual(storage.read_journal(self.inventory_path).items, {"A": ["A", "first"]})
+
+        save_item(self.inventory_path, "B", "second")
+        journal = storage.read_journal(self.inventory_path)
+        self.assertEqual(journal.items, {"A": ["A", "first"], "B": ["B", "second"]})
+        self.assertEqual(journal.removed_item_ids, set())
+
+    def test_torn_line_in_the_middle_drops_only_its_save(self):
+        save_item(self.inventory_path, "A", "first")
+        with open(self.journal_path, 'a') as file:
+            file.write('{"op":"item","id":"X","row":["X"\n{"op":"commit","item_columns":[]}\n')
+        with open(self.journal_path, 'a') as file:
+            file.write('{"op":"item","id":"Y","row":["Y","y"]}\n{"op":"commit","item_columns":[]}\n')
+
+        journal = storage.read_journal(self.inventory_path)
+        self.assertEqual(journal.items, {"A": ["A", "first"], "Y": ["Y", "y"]})
+
+    def test_compaction_keeps_the_saves_after_a_torn_write(self):
+        storage.write_csv_files(self.inventory_path, storage.InventorySnapshot(self.inventory_path),
+                [ITEM_COLUMNS, ["A", "old"]])
+        save_item(self.inventory_path, "A", "first")
+        with open(self.journal_path, 'a') as file:
+            file.write('{"op":"item"')
+        save_item(self.inventory_path, "B", "second")
+
+        storage.compact_journal(self.inventory_path)
+        self.assertFalse(os.path.exists(self.journal_path))
+        self.assertEqual(list(storage.iter_csv_rows(self.inventory_path + "/inventory.csv")),
+                [ITEM_COLUMNS, ["A", "first"], ["B", "second"]])
+
+if __name__ == "__main__":
+    unittest.main()